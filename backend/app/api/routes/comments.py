@@ -1,7 +1,7 @@
 import uuid
 
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select
+from sqlalchemy import delete, exists, lambda_stmt, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.schemas import CommentCreate, CommentResponse, CommentUpdate
@@ -12,12 +12,12 @@ from app.models.document import Document
 router = APIRouter(prefix="/documents/{document_id}/comments", tags=["comments"])
 
 
-async def _get_document(document_id: uuid.UUID, db: AsyncSession) -> Document:
-    result = await db.execute(select(Document).where(Document.id == document_id))
-    document = result.scalar_one_or_none()
-    if not document:
+async def _ensure_document_exists(document_id: uuid.UUID, db: AsyncSession):
+    found = await db.scalar(
+        lambda_stmt(lambda: select(exists().where(Document.id == document_id)))
+    )
+    if not found:
         raise HTTPException(status_code=404, detail="Document not found")
-    return document
 
 
 @router.get("/", response_model=list[CommentResponse])
@@ -26,10 +26,9 @@ async def list_comments(
     page_number: int | None = None,
     db: AsyncSession = Depends(get_db),
 ):
-    await _get_document(document_id, db)
-
+    # Read-only: plain column rows skip ORM identity-map and instrumentation overhead
     query = (
-        select(Comment)
+        select(*Comment.__table__.c)
         .where(Comment.document_id == document_id)
         .order_by(Comment.created_at.asc())
     )
@@ -37,7 +36,11 @@ async def list_comments(
         query = query.where(Comment.page_number == page_number)
 
     result = await db.execute(query)
-    return result.scalars().all()
+    comments = result.mappings().all()
+    # Only an empty result needs the extra existence probe to tell "no comments" from 404
+    if not comments:
+        await _ensure_document_exists(document_id, db)
+    return comments
 
 
 @router.post("/", response_model=CommentResponse, status_code=201)
@@ -46,7 +49,7 @@ async def create_comment(
     body: CommentCreate,
     db: AsyncSession = Depends(get_db),
 ):
-    await _get_document(document_id, db)
+    await _ensure_document_exists(document_id, db)
 
     comment = Comment(
         document_id=document_id,
@@ -69,17 +72,16 @@ async def update_comment(
     db: AsyncSession = Depends(get_db),
 ):
     result = await db.execute(
-        select(Comment).where(
-            Comment.id == comment_id, Comment.document_id == document_id
-        )
+        update(Comment)
+        .where(Comment.id == comment_id, Comment.document_id == document_id)
+        .values(content=body.content)
+        .returning(Comment)
     )
     comment = result.scalar_one_or_none()
     if not comment:
         raise HTTPException(status_code=404, detail="Comment not found")
 
-    comment.content = body.content
     await db.commit()
-    await db.refresh(comment)
     return comment
 
 
@@ -90,13 +92,11 @@ async def delete_comment(
     db: AsyncSession = Depends(get_db),
 ):
     result = await db.execute(
-        select(Comment).where(
-            Comment.id == comment_id, Comment.document_id == document_id
-        )
+        delete(Comment)
+        .where(Comment.id == comment_id, Comment.document_id == document_id)
+        .returning(Comment.id)
     )
-    comment = result.scalar_one_or_none()
-    if not comment:
+    if result.scalar_one_or_none() is None:
         raise HTTPException(status_code=404, detail="Comment not found")
 
-    await db.delete(comment)
     await db.commit()
@@ -1,8 +1,13 @@
+import asyncio
+import logging
+import os
 import secrets
 import uuid
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile
-from sqlalchemy import func, select
+from fastapi import APIRouter, Depends, HTTPException, Response, UploadFile
+from pydantic import TypeAdapter
+from sqlalchemy import delete, func, insert, lambda_stmt, literal, select, update
+from sqlalchemy.dialects.postgresql import aggregate_order_by
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.schemas import (
@@ -18,8 +23,14 @@ from app.config import settings
 from app.db.database import get_db
 from app.models.document import Document, DocumentStatus
 from app.models.ocr_result import OCRPage
-from app.services.queue import enqueue_ocr_job
-from app.services.storage import storage_service
+from app.services.queue import enqueue_ocr_job, enqueue_ocr_jobs_bulk, is_job_inflight
+from app.services.storage import (
+    get_cached_presigned_url,
+    get_presigned_urls,
+    storage_service,
+)
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/documents", tags=["documents"])
 
@@ -31,6 +42,60 @@ ALLOWED_CONTENT_TYPES = {
     "image/bmp",
 }
 
+# Columns shown in document listings; large text/JSONB columns (ocr_text,
+# search_text, ai_raw_response, entities, key_points) are only loaded per document
+DOCUMENT_LIST_COLUMNS = (
+    Document.id,
+    Document.filename,
+    Document.original_filename,
+    Document.content_type,
+    Document.file_size,
+    Document.s3_key,
+    Document.status,
+    Document.page_count,
+    Document.category,
+    Document.category_confidence,
+    Document.summary,
+    Document.tags,
+    Document.document_date,
+    Document.share_token,
+    Document.is_public,
+    Document.created_at,
+    Document.updated_at,
+)
+
+# Validate whole result lists in one pydantic-core call instead of per-row model_validate
+_document_list_adapter = TypeAdapter(list[DocumentResponse])
+_ocr_page_list_adapter = TypeAdapter(list[OCRPageResponse])
+
+# Max number of files from one batch request streamed to storage at once
+BATCH_UPLOAD_CONCURRENCY = 10
+
+
+# Hot by-id lookups are built as lambda statements: SQLAlchemy caches the constructed
+# statement per call site and only re-binds the closure values as parameters
+def _select_document(document_id: uuid.UUID):
+    return lambda_stmt(lambda: select(Document).where(Document.id == document_id))
+
+
+def _select_ocr_page(document_id: uuid.UUID, page_number: int):
+    return lambda_stmt(
+        lambda: select(OCRPage).where(
+            OCRPage.document_id == document_id,
+            OCRPage.page_number == page_number,
+        )
+    )
+
+
+def _get_upload_size(file: UploadFile) -> int:
+    """Size of the spooled upload, without reading it into memory."""
+    if file.size is not None:
+        return file.size
+    file.file.seek(0, os.SEEK_END)
+    size = file.file.tell()
+    file.file.seek(0)
+    return size
+
 
 @router.post("/upload", response_model=UploadResponse)
 async def upload_document(file: UploadFile, db: AsyncSession = Depends(get_db)):
@@ -41,8 +106,7 @@ async def upload_document(file: UploadFile, db: AsyncSession = Depends(get_db)):
             f"Allowed: {', '.join(ALLOWED_CONTENT_TYPES)}",
         )
 
-    file_data = await file.read()
-    file_size = len(file_data)
+    file_size = _get_upload_size(file)
     max_size = settings.max_upload_size_mb * 1024 * 1024
     if file_size > max_size:
         raise HTTPException(
@@ -51,7 +115,7 @@ async def upload_document(file: UploadFile, db: AsyncSession = Depends(get_db)):
         )
 
     s3_key = storage_service.generate_s3_key(file.filename)
-    await storage_service.upload_file(s3_key, file_data, file.content_type)
+    await storage_service.upload_file(s3_key, file.file, file.content_type)
 
     document = Document(
         filename=s3_key.split("/")[-1],
@@ -80,58 +144,79 @@ async def upload_document(file: UploadFile, db: AsyncSession = Depends(get_db)):
 async def upload_documents_batch(
     files: list[UploadFile], db: AsyncSession = Depends(get_db)
 ):
-    results = []
-    for file in files:
+    semaphore = asyncio.Semaphore(BATCH_UPLOAD_CONCURRENCY)
+    max_size = settings.max_upload_size_mb * 1024 * 1024
+
+    async def store_file(file: UploadFile) -> dict | UploadResponse:
         if file.content_type not in ALLOWED_CONTENT_TYPES:
+            return UploadResponse(
+                id=uuid.uuid4(),
+                filename=file.filename,
+                status=DocumentStatus.FAILED,
+                message=f"Unsupported file type: {file.content_type}",
+            )
+
+        file_size = _get_upload_size(file)
+        if file_size > max_size:
+            return UploadResponse(
+                id=uuid.uuid4(),
+                filename=file.filename,
+                status=DocumentStatus.FAILED,
+                message=f"File too large: {file_size} bytes",
+            )
+
+        s3_key = storage_service.generate_s3_key(file.filename)
+        async with semaphore:
+            await storage_service.upload_file(s3_key, file.file, file.content_type)
+
+        return {
+            "filename": s3_key.split("/")[-1],
+            "original_filename": file.filename,
+            "content_type": file.content_type,
+            "file_size": file_size,
+            "s3_key": s3_key,
+            "status": DocumentStatus.UPLOADED,
+        }
+
+    # Storage uploads run concurrently; the DB session is only touched afterwards
+    stored = await asyncio.gather(*(store_file(f) for f in files), return_exceptions=True)
+
+    # One multi-row INSERT ... RETURNING for every accepted file
+    rows = [item for item in stored if isinstance(item, dict)]
+    documents = []
+    if rows:
+        result = await db.scalars(
+            insert(Document).returning(Document, sort_by_parameter_order=True), rows
+        )
+        documents = result.all()
+        await db.commit()
+        await enqueue_ocr_jobs_bulk([str(doc.id) for doc in documents])
+
+    inserted = iter(documents)
+    results = []
+    for file, item in zip(files, stored):
+        if isinstance(item, dict):
+            document = next(inserted)
             results.append(
                 UploadResponse(
-                    id=uuid.uuid4(),
-                    filename=file.filename,
-                    status=DocumentStatus.FAILED,
-                    message=f"Unsupported file type: {file.content_type}",
+                    id=document.id,
+                    filename=document.original_filename,
+                    status=document.status,
+                    message="File uploaded successfully. OCR processing queued.",
                 )
             )
-            continue
-
-        file_data = await file.read()
-        file_size = len(file_data)
-        max_size = settings.max_upload_size_mb * 1024 * 1024
-        if file_size > max_size:
+        elif isinstance(item, BaseException):
+            logger.error(f"Batch upload failed for {file.filename}: {item}")
             results.append(
                 UploadResponse(
                     id=uuid.uuid4(),
                     filename=file.filename,
                     status=DocumentStatus.FAILED,
-                    message=f"File too large: {file_size} bytes",
+                    message="Upload failed",
                 )
             )
-            continue
-
-        s3_key = storage_service.generate_s3_key(file.filename)
-        await storage_service.upload_file(s3_key, file_data, file.content_type)
-
-        document = Document(
-            filename=s3_key.split("/")[-1],
-            original_filename=file.filename,
-            content_type=file.content_type,
-            file_size=file_size,
-            s3_key=s3_key,
-            status=DocumentStatus.UPLOADED,
-        )
-        db.add(document)
-        await db.commit()
-        await db.refresh(document)
-
-        await enqueue_ocr_job(str(document.id))
-
-        results.append(
-            UploadResponse(
-                id=document.id,
-                filename=document.original_filename,
-                status=document.status,
-                message="File uploaded successfully. OCR processing queued.",
-            )
-        )
+        else:
+            results.append(item)
     return results
 
 
@@ -142,54 +227,70 @@ async def list_documents(
     status: DocumentStatus | None = None,
     db: AsyncSession = Depends(get_db),
 ):
-    query = select(Document).order_by(Document.created_at.desc())
-    count_query = select(func.count(Document.id))
-
+    # The window count returns the filtered total alongside the page in one round trip
+    query = select(*DOCUMENT_LIST_COLUMNS, func.count().over().label("total")).order_by(
+        Document.created_at.desc()
+    )
     if status:
         query = query.where(Document.status == status)
-        count_query = count_query.where(Document.status == status)
-
-    total_result = await db.execute(count_query)
-    total = total_result.scalar()
 
     query = query.offset(skip).limit(limit)
     result = await db.execute(query)
-    documents = result.scalars().all()
-
-    doc_responses = []
-    for doc in documents:
-        url = await storage_service.get_presigned_url(doc.s3_key)
-        resp = DocumentResponse.model_validate(doc)
+    documents = result.mappings().all()
+
+    if documents:
+        total = documents[0]["total"]
+    elif skip > 0:
+        # Past the last page there is no row to carry the window count
+        count_query = select(func.count(Document.id))
+        if status:
+            count_query = count_query.where(Document.status == status)
+        total = await db.scalar(count_query)
+    else:
+        total = 0
+
+    urls = await get_presigned_urls([doc["s3_key"] for doc in documents])
+    doc_responses = _document_list_adapter.validate_python(documents)
+    for resp, url in zip(doc_responses, urls):
         resp.download_url = url
-        doc_responses.append(resp)
 
     return DocumentListResponse(documents=doc_responses, total=total)
 
 
 @router.get("/{document_id}", response_model=DocumentResponse)
 async def get_document(document_id: uuid.UUID, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Document).where(Document.id == document_id))
+    result = await db.execute(_select_document(document_id))
     document = result.scalar_one_or_none()
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
 
-    url = await storage_service.get_presigned_url(document.s3_key)
+    url = await get_cached_presigned_url(document.s3_key)
     resp = DocumentResponse.model_validate(document)
     resp.download_url = url
     return resp
 
 
-@router.delete("/{document_id}")
+@router.delete("/{document_id}", status_code=204, response_class=Response)
 async def delete_document(document_id: uuid.UUID, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Document).where(Document.id == document_id))
-    document = result.scalar_one_or_none()
-    if not document:
+    # Page images are removed together with the original (pages cascade in the DB)
+    page_keys = (
+        await db.scalars(
+            select(OCRPage.page_image_s3_key).where(
+                OCRPage.document_id == document_id,
+                OCRPage.page_image_s3_key.is_not(None),
+            )
+        )
+    ).all()
+    result = await db.execute(
+        delete(Document).where(Document.id == document_id).returning(Document.s3_key)
+    )
+    s3_key = result.scalar_one_or_none()
+    if s3_key is None:
         raise HTTPException(status_code=404, detail="Document not found")
-
-    await storage_service.delete_file(document.s3_key)
-    await db.delete(document)
     await db.commit()
 
+    await storage_service.delete_files([s3_key, *page_keys])
+
     # Remove from search index
     try:
         from app.config import settings as _settings
@@ -198,35 +299,32 @@ async def delete_document(document_id: uuid.UUID, db: AsyncSession = Depends(get
             pg_delete_document(str(document_id))
         else:
             from app.services.search import delete_document as search_delete
-            search_delete(str(document_id))
+            await search_delete(str(document_id))
     except Exception:
         pass
 
-    return {"message": "Document deleted successfully"}
+    return Response(status_code=204)
 
 
 @router.get("/{document_id}/ocr", response_model=list[OCRPageResponse])
 async def get_ocr_results(document_id: uuid.UUID, db: AsyncSession = Depends(get_db)):
     """Get per-page OCR results for a document."""
-    result = await db.execute(select(Document).where(Document.id == document_id))
+    result = await db.execute(_select_document(document_id))
     if not result.scalar_one_or_none():
         raise HTTPException(status_code=404, detail="Document not found")
 
+    # Read-only: plain column rows skip ORM identity-map and instrumentation overhead
     pages_result = await db.execute(
-        select(OCRPage)
+        select(*OCRPage.__table__.c)
         .where(OCRPage.document_id == document_id)
         .order_by(OCRPage.page_number)
     )
-    pages = pages_result.scalars().all()
-
-    responses = []
-    for page in pages:
-        resp = OCRPageResponse.model_validate(page)
-        if page.page_image_s3_key:
-            resp.page_image_url = await storage_service.get_presigned_url(
-                page.page_image_s3_key
-            )
-        responses.append(resp)
+    pages = pages_result.mappings().all()
+
+    urls = await get_presigned_urls([page["page_image_s3_key"] for page in pages])
+    responses = _ocr_page_list_adapter.validate_python(pages)
+    for resp, url in zip(responses, urls):
+        resp.page_image_url = url
 
     return responses
 
@@ -236,21 +334,14 @@ async def get_ocr_page(
     document_id: uuid.UUID, page_number: int, db: AsyncSession = Depends(get_db)
 ):
     """Get OCR result for a specific page."""
-    result = await db.execute(
-        select(OCRPage).where(
-            OCRPage.document_id == document_id,
-            OCRPage.page_number == page_number,
-        )
-    )
+    result = await db.execute(_select_ocr_page(document_id, page_number))
     page = result.scalar_one_or_none()
     if not page:
         raise HTTPException(status_code=404, detail="OCR page not found")
 
     resp = OCRPageResponse.model_validate(page)
     if page.page_image_s3_key:
-        resp.page_image_url = await storage_service.get_presigned_url(
-            page.page_image_s3_key
-        )
+        resp.page_image_url = await get_cached_presigned_url(page.page_image_s3_key)
     return resp
 
 
@@ -259,26 +350,29 @@ async def reprocess_document(
     document_id: uuid.UUID, db: AsyncSession = Depends(get_db)
 ):
     """Re-queue a document for OCR processing."""
-    result = await db.execute(select(Document).where(Document.id == document_id))
+    result = await db.execute(_select_document(document_id))
     document = result.scalar_one_or_none()
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
+    # A running job would write its results over the reset below. A PROCESSING
+    # document without a lease was left behind by a dead worker and can be reset.
+    if document.status == DocumentStatus.PROCESSING and await is_job_inflight(str(document_id)):
+        raise HTTPException(status_code=409, detail="Document is being processed")
 
-    # Delete existing OCR results
+    # Delete existing OCR results (committed together with the status reset below)
     await db.execute(
-        select(OCRPage).where(OCRPage.document_id == document_id).execution_options(
-            synchronize_session=False
-        )
+        delete(OCRPage)
+        .where(OCRPage.document_id == document_id)
+        .execution_options(synchronize_session=False)
     )
-    from sqlalchemy import delete
-    await db.execute(delete(OCRPage).where(OCRPage.document_id == document_id))
 
     document.status = DocumentStatus.UPLOADED
     document.ocr_text = None
     document.page_count = None
     await db.commit()
 
-    await enqueue_ocr_job(str(document_id))
+    if not await enqueue_ocr_job(str(document_id)):
+        return {"message": "Document is already queued for processing"}
     return {"message": "Document queued for reprocessing"}
 
 
@@ -294,39 +388,37 @@ async def correct_ocr_text(
 ):
     """Manually correct OCR text for a specific page."""
     result = await db.execute(
-        select(OCRPage).where(
+        update(OCRPage)
+        .where(
             OCRPage.document_id == document_id,
             OCRPage.page_number == page_number,
         )
+        .values(full_text=body.full_text)
+        .returning(OCRPage)
     )
     page = result.scalar_one_or_none()
     if not page:
         raise HTTPException(status_code=404, detail="OCR page not found")
 
-    page.full_text = body.full_text
-    await db.commit()
-    await db.refresh(page)
-
-    # Update combined ocr_text on the document
-    pages_result = await db.execute(
-        select(OCRPage)
+    # Recompute combined ocr_text on the document inside PostgreSQL
+    combined_text = (
+        select(
+            func.string_agg(
+                func.coalesce(OCRPage.full_text, ""),
+                aggregate_order_by(literal("\n\n"), OCRPage.page_number),
+            )
+        )
         .where(OCRPage.document_id == document_id)
-        .order_by(OCRPage.page_number)
+        .scalar_subquery()
     )
-    all_pages = pages_result.scalars().all()
-    combined_text = "\n\n".join(p.full_text or "" for p in all_pages)
-
-    doc_result = await db.execute(select(Document).where(Document.id == document_id))
-    doc = doc_result.scalar_one_or_none()
-    if doc:
-        doc.ocr_text = combined_text
-        await db.commit()
+    await db.execute(
+        update(Document).where(Document.id == document_id).values(ocr_text=combined_text)
+    )
+    await db.commit()
 
     resp = OCRPageResponse.model_validate(page)
     if page.page_image_s3_key:
-        resp.page_image_url = await storage_service.get_presigned_url(
-            page.page_image_s3_key
-        )
+        resp.page_image_url = await get_cached_presigned_url(page.page_image_s3_key)
     return resp
 
 
@@ -340,7 +432,7 @@ async def create_share_link(
     db: AsyncSession = Depends(get_db),
 ):
     """Generate a share link for a document."""
-    result = await db.execute(select(Document).where(Document.id == document_id))
+    result = await db.execute(_select_document(document_id))
     document = result.scalar_one_or_none()
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
@@ -369,7 +461,7 @@ async def revoke_share_link(
     db: AsyncSession = Depends(get_db),
 ):
     """Revoke the share link for a document."""
-    result = await db.execute(select(Document).where(Document.id == document_id))
+    result = await db.execute(_select_document(document_id))
     document = result.scalar_one_or_none()
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
@@ -399,7 +491,7 @@ async def get_shared_document(share_token: str, db: AsyncSession = Depends(get_d
     if not document:
         raise HTTPException(status_code=404, detail="Shared document not found")
 
-    url = await storage_service.get_presigned_url(document.s3_key)
+    url = await get_cached_presigned_url(document.s3_key)
     resp = DocumentResponse.model_validate(document)
     resp.download_url = url
     return resp
@@ -41,7 +41,7 @@ async def search(
         else:
             from app.services.search import search_documents
 
-            result = search_documents(
+            result = await search_documents(
                 query=q,
                 category=category,
                 tags=tags,
@@ -4,6 +4,10 @@ from pydantic_settings import BaseSettings
 class Settings(BaseSettings):
     # Database
     database_url: str = "postgresql+asyncpg://ocrcheck:ocrcheck_dev@db:5432/ocrcheck"
+    db_pool_size: int = 20
+    db_max_overflow: int = 40
+    db_pool_recycle: int = 1800  # seconds
+    db_pool_pre_ping: bool = True
 
     # S3 / MinIO
     s3_endpoint_url: str = "http://minio:9000"
@@ -25,6 +29,22 @@ class Settings(BaseSettings):
     ai_model: str = "claude-sonnet-4-5-20250929"
     ai_max_tokens: int = 4096
     ai_enabled: bool = True  # set False to skip AI analysis
+    # Analyse documents via the Message Batches API (50% cost, results within hours)
+    ai_batch_enabled: bool = False
+    ai_batch_max_items: int = 100
+    ai_batch_poll_interval: int = 60  # seconds
+    # Upload page images once via the Files API and reference them by file_id
+    ai_files_api_enabled: bool = False
+
+    # OCR worker: pages detected / table-extracted concurrently (threads sharing
+    # one engine; size to physical cores when > 1)
+    ocr_threads: int = 1
+    # ONNX Runtime threads per session; 0 = ORT default (one per physical core),
+    # or 1 when ocr_threads > 1
+    ocr_intra_op_threads: int = 0
+    ocr_inter_op_threads: int = 1
+    ocr_rec_int8: bool = False  # use the INT8-quantized recognizer (check accuracy first)
+    ocr_device: str = "cpu"  # "cpu" or "cuda" (needs onnxruntime-gpu)
 
     # Backend selection (for HF Spaces single-container deploy)
     storage_backend: str = "s3"  # "s3" or "filesystem"
@@ -1,13 +1,17 @@
+import asyncio
 from contextlib import asynccontextmanager
-from pathlib import Path
 
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import FileResponse, JSONResponse
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
 
 from app.api.routes import comments, documents, health, search
 from app.config import settings
-from app.db.database import init_db
+from app.db.database import init_db, warm_pool
+from app.services.queue import close_redis
 from app.services.storage import storage_service
 
 
@@ -15,9 +19,22 @@ from app.services.storage import storage_service
 async def lifespan(app: FastAPI):
     # Startup
     await init_db()
+    await warm_pool()
+    await storage_service.start()
     await storage_service.ensure_bucket()
+    warmer = None
+    if settings.search_backend != "postgresql":
+        from app.services.search import run_popular_search_warmer
+        warmer = asyncio.create_task(run_popular_search_warmer())
     yield
     # Shutdown
+    if warmer is not None:
+        warmer.cancel()
+    await storage_service.close()
+    await close_redis()
+    if settings.search_backend != "postgresql":
+        from app.services.search import close_async_client
+        await close_async_client()
 
 
 app = FastAPI(
@@ -27,6 +44,58 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+# Slack for multipart boundaries and part headers around the file itself
+UPLOAD_MULTIPART_OVERHEAD = 64 * 1024
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Reject oversized single uploads from Content-Length before the body is received.
+    Plain ASGI so other requests pass straight through; registered before
+    CORSMiddleware so the 413 still carries CORS headers.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if (
+            scope["type"] == "http"
+            and scope["method"] == "POST"
+            and scope["path"] == "/api/documents/upload"
+        ):
+            max_size = settings.max_upload_size_mb * 1024 * 1024
+            limit = max_size + UPLOAD_MULTIPART_OVERHEAD
+            content_length = Headers(scope=scope).get("content-length", "")
+            if content_length.isdigit() and int(content_length) > limit:
+                response = JSONResponse(
+                    status_code=413,
+                    content={"detail": f"File too large. Max: {max_size} bytes"},
+                )
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+class APIGZipMiddleware:
+    """
+    Gzip API responses only: OCR text and AI results are large, highly
+    compressible JSON. Files under /files are already-compressed images and
+    PDFs, and must keep their Content-Length and range support.
+    """
+
+    def __init__(self, app: ASGIApp, **options):
+        self.app = app
+        self.gzip = GZipMiddleware(app, **options)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] == "http" and scope["path"].startswith("/api/"):
+            await self.gzip(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+
+app.add_middleware(UploadSizeLimitMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -39,6 +108,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(APIGZipMiddleware, minimum_size=1024, compresslevel=5)
 
 app.include_router(health.router, prefix="/api")
 app.include_router(documents.router, prefix="/api")
@@ -52,12 +122,14 @@ async def serve_file(file_path: str):
     """Serve uploaded files from local filesystem (used when storage_backend=filesystem)."""
     if settings.storage_backend != "filesystem":
         raise HTTPException(status_code=404, detail="File serving only available in filesystem mode")
-    full_path = Path(settings.upload_dir) / file_path
-    if not full_path.exists() or not full_path.is_file():
-        raise HTTPException(status_code=404, detail="File not found")
+    full_path = storage_service.open_file(file_path)
     # Prevent path traversal
     try:
-        full_path.resolve().relative_to(Path(settings.upload_dir).resolve())
+        full_path.resolve().relative_to(storage_service.base_dir.resolve())
     except ValueError:
         raise HTTPException(status_code=403, detail="Access denied")
+    if not full_path.is_file():
+        raise HTTPException(status_code=404, detail="File not found")
+    # Streamed from disk in chunks with Content-Length, ETag and Last-Modified;
+    # /files is outside the gzip layer, so none of these are stripped
     return FileResponse(full_path)
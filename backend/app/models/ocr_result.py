@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime
 
-from sqlalchemy import DateTime, Float, Integer, String, Text, ForeignKey, func
+from sqlalchemy import DateTime, Float, Index, Integer, String, Text, ForeignKey, func
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -12,6 +12,9 @@ class OCRPage(Base):
     """Per-page OCR results."""
 
     __tablename__ = "ocr_pages"
+    __table_args__ = (
+        Index("ix_ocrpages_doc_page", "document_id", "page_number", unique=True),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
@@ -1,15 +1,22 @@
 """AI document understanding service using Claude API."""
 
 import base64
-import json
+import functools
+import hashlib
 import logging
+import re
 
 import anthropic
+import orjson
 
 from app.config import settings
+from app.services import cache
 
 logger = logging.getLogger(__name__)
 
+# Bump whenever the prompts below change so cached analyses are not reused
+PROMPT_VERSION = "v1"
+
 SYSTEM_PROMPT = """\
 あなたは日本語の事務書類を分析する専門家です。
 OCRで読み取ったテキストを分析し、以下の情報を抽出してください。
@@ -56,43 +63,181 @@ VISION_ANALYSIS_PROMPT = """\
 """
 
 
+def _cache_key(text: str, image_bytes: bytes | None = None) -> str:
+    h = hashlib.sha256(f"{settings.ai_model}|{PROMPT_VERSION}|{text}".encode())
+    if image_bytes is not None:
+        h.update(image_bytes)
+    return h.hexdigest()
+
+
+# The client is created once per process so the HTTPS keep-alive pool is reused across calls
+@functools.lru_cache(maxsize=1)
 def _get_client() -> anthropic.Anthropic:
     return anthropic.Anthropic(api_key=settings.anthropic_api_key)
 
 
-def analyze_document_text(ocr_text: str) -> dict | None:
+# Input budget for the OCR text, in estimated tokens
+MAX_INPUT_TOKENS = 15000
+
+
+def _estimate_tokens(text: str) -> int:
     """
-    Analyze document using OCR text only (no image).
-    Returns parsed AI analysis result or None on failure.
+    Cheap offline token estimate: ~4 ASCII characters per token, and about one
+    token per CJK/other character, which dominate Japanese documents.
+    """
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    return -(-ascii_chars // 4) + (len(text) - ascii_chars)
+
+
+def _truncate(ocr_text: str | None) -> str:
+    """Keep the longest run of whole lines that fits MAX_INPUT_TOKENS."""
+    if not ocr_text:
+        return ""
+    if _estimate_tokens(ocr_text) <= MAX_INPUT_TOKENS:
+        return ocr_text
+
+    budget = MAX_INPUT_TOKENS
+    kept = []
+    for line in ocr_text.splitlines(keepends=True):
+        cost = _estimate_tokens(line)
+        if cost > budget:
+            if not kept:
+                # A single oversized line: fall back to a character cut
+                kept.append(line[:budget])
+            break
+        kept.append(line)
+        budget -= cost
+    return "".join(kept)
+
+
+def _text_request(text: str) -> dict:
+    return {
+        "model": settings.ai_model,
+        "max_tokens": settings.ai_max_tokens,
+        "system": SYSTEM_PROMPT,
+        "messages": [
+            {
+                "role": "user",
+                "content": ANALYSIS_PROMPT.format(ocr_text=text),
+            }
+        ],
+    }
+
+
+# The Files API is in beta: uploads and messages referencing a file_id need this flag
+FILES_API_BETA = "files-api-2025-04-14"
+
+
+def _upload_image_once(image_bytes: bytes, media_type: str) -> str | None:
+    """
+    Upload a page image to the Files API and return its file_id.
+    IDs are cached in Redis by content hash.
+    """
+    key = "file:" + hashlib.sha256(image_bytes).hexdigest()
+    cached = cache.check(key)
+    if cached is not None:
+        return cached["file_id"]
+    try:
+        extension = media_type.split("/")[-1]
+        uploaded = _get_client().beta.files.upload(
+            file=(f"page.{extension}", image_bytes, media_type),
+            betas=[FILES_API_BETA],
+        )
+    except Exception as e:
+        logger.warning(f"Files API upload failed, sending image inline: {e}")
+        return None
+    cache.save(key, {"file_id": uploaded.id})
+    return uploaded.id
+
+
+def _image_source(image_bytes: bytes, media_type: str) -> dict:
+    if settings.ai_files_api_enabled:
+        file_id = _upload_image_once(image_bytes, media_type)
+        if file_id:
+            return {"type": "file", "file_id": file_id}
+    return {
+        "type": "base64",
+        "media_type": media_type,
+        "data": base64.standard_b64encode(image_bytes).decode("utf-8"),
+    }
+
+
+def _vision_request(text: str, image_bytes: bytes, media_type: str) -> dict:
+    source = _image_source(image_bytes, media_type)
+    request = {
+        "model": settings.ai_model,
+        "max_tokens": settings.ai_max_tokens,
+        "system": SYSTEM_PROMPT,
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "image",
+                        "source": source,
+                        # Caches system + image, so retries of the same page are cheap.
+                        # The system prompt alone is below the minimum cacheable prefix.
+                        "cache_control": {"type": "ephemeral"},
+                    },
+                    {
+                        "type": "text",
+                        "text": VISION_ANALYSIS_PROMPT.format(ocr_text=text),
+                    },
+                ],
+            }
+        ],
+    }
+    if source["type"] == "file":
+        # File sources are only accepted by the beta Messages endpoint
+        request["betas"] = [FILES_API_BETA]
+    return request
+
+
+def _stream_message(request: dict):
+    """
+    Run a request as a stream and return the final message.
+    Tokens are received as they are generated rather than in one response
+    at the end, and long max_tokens values don't hit the non-streaming timeout.
+    Requests carrying a betas list go through the beta Messages endpoint.
     """
+    client = _get_client()
+    messages = client.beta.messages if "betas" in request else client.messages
+    with messages.stream(**request) as stream:
+        return stream.get_final_message()
+
+
+def _ai_available() -> bool:
     if not settings.ai_enabled or not settings.anthropic_api_key:
         logger.info("AI analysis skipped (disabled or no API key)")
-        return None
+        return False
+    return True
+
 
+def _text_long_enough(ocr_text: str | None) -> bool:
     if not ocr_text or len(ocr_text.strip()) < 10:
         logger.info("AI analysis skipped (text too short)")
-        return None
+        return False
+    return True
 
-    # Truncate very long texts to stay within token limits
-    max_chars = 15000
-    text = ocr_text[:max_chars] if len(ocr_text) > max_chars else ocr_text
 
-    try:
-        client = _get_client()
-        response = client.messages.create(
-            model=settings.ai_model,
-            max_tokens=settings.ai_max_tokens,
-            system=SYSTEM_PROMPT,
-            messages=[
-                {
-                    "role": "user",
-                    "content": ANALYSIS_PROMPT.format(ocr_text=text),
-                }
-            ],
-        )
+def analyze_document_text(ocr_text: str) -> dict | None:
+    """
+    Analyze document using OCR text only (no image).
+    Returns parsed AI analysis result or None on failure.
+    """
+    if not _ai_available() or not _text_long_enough(ocr_text):
+        return None
 
-        return _parse_response(response)
+    text = _truncate(ocr_text)
+    key = _cache_key(text)
+    cached = cache.check(key)
+    if cached is not None:
+        logger.info("AI text analysis served from cache")
+        return cached
 
+    try:
+        response = _stream_message(_text_request(text))
+        return _finish(response, key)
     except Exception as e:
         logger.exception(f"AI text analysis failed: {e}")
         return None
@@ -107,46 +252,88 @@ def analyze_document_with_image(
     Analyze document using both OCR text and page image (Vision).
     Returns parsed AI analysis result or None on failure.
     """
-    if not settings.ai_enabled or not settings.anthropic_api_key:
-        logger.info("AI analysis skipped (disabled or no API key)")
+    if not _ai_available():
         return None
 
-    text = ocr_text[:15000] if ocr_text and len(ocr_text) > 15000 else (ocr_text or "")
+    text = _truncate(ocr_text)
+    key = _cache_key(text, image_bytes)
+    cached = cache.check(key)
+    if cached is not None:
+        logger.info("AI vision analysis served from cache")
+        return cached
 
     try:
-        client = _get_client()
-        image_b64 = base64.standard_b64encode(image_bytes).decode("utf-8")
-
-        response = client.messages.create(
-            model=settings.ai_model,
-            max_tokens=settings.ai_max_tokens,
-            system=SYSTEM_PROMPT,
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "image",
-                            "source": {
-                                "type": "base64",
-                                "media_type": media_type,
-                                "data": image_b64,
-                            },
-                        },
-                        {
-                            "type": "text",
-                            "text": VISION_ANALYSIS_PROMPT.format(ocr_text=text),
-                        },
-                    ],
-                }
-            ],
-        )
+        response = _stream_message(_vision_request(text, image_bytes, media_type))
+        return _finish(response, key)
+    except Exception as e:
+        logger.exception(f"AI vision analysis failed: {e}")
+        return None
+
+
+# --- Message Batches API (asynchronous, billed at 50%) ---
+
 
-        return _parse_response(response)
+def build_batch_request(document_id: str, ocr_text: str) -> dict:
+    """One Message Batches entry for a text-only analysis, identified by document ID."""
+    return {"custom_id": document_id, "params": _text_request(_truncate(ocr_text))}
 
+
+def submit_analysis_batch(requests: list[dict]) -> str | None:
+    """Submit batch entries; returns the batch ID or None if nothing was submitted."""
+    if not requests or not _ai_available():
+        return None
+    try:
+        batch = _get_client().messages.batches.create(requests=requests)
     except Exception as e:
-        logger.exception(f"AI vision analysis failed: {e}")
+        logger.exception(f"AI batch submission failed: {e}")
         return None
+    logger.info(f"Submitted AI batch {batch.id} with {len(requests)} document(s)")
+    return batch.id
+
+
+def collect_analysis_batch(batch_id: str) -> dict[str, dict | None] | None:
+    """
+    Results keyed by document ID once the batch has ended.
+    Returns None while the batch is still processing.
+    """
+    client = _get_client()
+    batch = client.messages.batches.retrieve(batch_id)
+    if batch.processing_status != "ended":
+        return None
+
+    results = {}
+    for entry in client.messages.batches.results(batch_id):
+        if entry.result.type == "succeeded":
+            _log_usage(entry.result.message)
+            results[entry.custom_id] = _parse_response(entry.result.message)
+        else:
+            logger.warning(f"AI batch {batch_id}: {entry.custom_id} {entry.result.type}")
+            results[entry.custom_id] = None
+    return results
+
+
+def _finish(response, key: str) -> dict | None:
+    """Log usage, parse the response and cache a successful result."""
+    _log_usage(response)
+    result = _parse_response(response)
+    if result is not None:
+        cache.save(key, result)
+    return result
+
+
+def _log_usage(response):
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    logger.info(
+        f"AI usage: input={usage.input_tokens}, output={usage.output_tokens}, "
+        f"cache_read={getattr(usage, 'cache_read_input_tokens', None)}, "
+        f"cache_write={getattr(usage, 'cache_creation_input_tokens', None)}"
+    )
+
+
+# Body of a leading ``` / ```json fence, up to the closing fence (or the end if unclosed)
+_FENCE_RE = re.compile(r"```[\w-]*[ \t]*\n(.*?)(?:\n```|\Z)", re.DOTALL)
 
 
 def _parse_response(response) -> dict | None:
@@ -156,30 +343,20 @@ def _parse_response(response) -> dict | None:
 
     raw_text = response.content[0].text.strip()
 
-    # Try to extract JSON from the response
-    # Handle cases where response might have markdown code blocks
+    # Handle cases where response might be wrapped in a markdown code block
     if raw_text.startswith("```"):
-        lines = raw_text.split("\n")
-        json_lines = []
-        in_block = False
-        for line in lines:
-            if line.startswith("```") and not in_block:
-                in_block = True
-                continue
-            elif line.startswith("```") and in_block:
-                break
-            elif in_block:
-                json_lines.append(line)
-        raw_text = "\n".join(json_lines)
+        match = _FENCE_RE.match(raw_text)
+        if match:
+            raw_text = match.group(1)
 
     try:
-        result = json.loads(raw_text)
+        result = orjson.loads(raw_text)
         # Validate expected fields
         if "category" not in result:
             logger.warning("AI response missing 'category' field")
             return None
         return result
-    except json.JSONDecodeError as e:
+    except orjson.JSONDecodeError as e:
         logger.warning(f"Failed to parse AI response as JSON: {e}")
         logger.debug(f"Raw response: {raw_text[:500]}")
         return None
@@ -0,0 +1,29 @@
+"""Redis-backed cache for AI analysis results, keyed by content hash."""
+
+import logging
+
+import orjson
+
+from app.services.queue import get_cache_redis
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "ocrcheck:aicache:"
+DEFAULT_TTL = 7 * 24 * 3600  # 7 days
+
+
+def check(key: str) -> dict | None:
+    """Return the cached result for key, or None on miss or Redis error."""
+    try:
+        cached = get_cache_redis().get(KEY_PREFIX + key)
+    except Exception as e:
+        logger.warning(f"AI cache lookup failed: {e}")
+        return None
+    return orjson.loads(cached) if cached else None
+
+
+def save(key: str, result: dict, ttl: int = DEFAULT_TTL):
+    try:
+        get_cache_redis().setex(KEY_PREFIX + key, ttl, orjson.dumps(result))
+    except Exception as e:
+        logger.warning(f"AI cache store failed: {e}")
@@ -1,33 +1,197 @@
-import json
+import atexit
 
+import orjson
+import redis
 import redis.asyncio as aioredis
 
 from app.config import settings
 
 QUEUE_NAME = "ocrcheck:jobs"
+# Documents waiting for Message Batches analysis, and submitted batch IDs
+AI_BATCH_QUEUE_NAME = "ocrcheck:ai-batch"
+AI_BATCH_PENDING_SET = "ocrcheck:ai-batches"
 
 
-async def get_redis():
-    return aioredis.from_url(settings.redis_url, decode_responses=True)
+# Shared pools: connections are reused instead of a TCP handshake per command.
+# The async pool blocks for a free connection rather than failing under bursts.
+_async_pool = aioredis.BlockingConnectionPool.from_url(
+    settings.redis_url, max_connections=32, decode_responses=True
+)
+# Blocking BRPOP holds a connection for up to its timeout, so queue traffic gets
+# its own small pool and never starves short cache GET/SET calls.
+_queue_pool = redis.ConnectionPool.from_url(
+    settings.redis_url, max_connections=4, decode_responses=True
+)
+_cache_pool = redis.ConnectionPool.from_url(
+    settings.redis_url, max_connections=32, decode_responses=True
+)
+atexit.register(_queue_pool.disconnect)
+atexit.register(_cache_pool.disconnect)
 
 
-async def enqueue_ocr_job(document_id: str):
-    r = await get_redis()
-    job = json.dumps({"type": "ocr", "document_id": document_id})
-    await r.lpush(QUEUE_NAME, job)
-    await r.aclose()
+def get_redis() -> aioredis.Redis:
+    return aioredis.Redis(connection_pool=_async_pool)
 
 
-def get_sync_redis():
-    import redis
-    return redis.from_url(settings.redis_url, decode_responses=True)
+async def close_redis():
+    await _async_pool.disconnect()
+
+
+def _ocr_job(document_id: str) -> bytes:
+    return orjson.dumps({"type": "ocr", "document_id": document_id})
+
+
+# Enqueue-once guard: a per-document key marks a job as queued or running, so an
+# API retry or a double-clicked "reprocess" cannot queue the same document twice.
+# The TTL lets a document be queued again if a worker died before clearing it.
+# Once a worker starts a job it shortens the TTL to a lease and keeps renewing
+# it, so a job lost in a crash blocks its document for minutes, not an hour.
+INFLIGHT_PREFIX = "ocrcheck:inflight:"
+INFLIGHT_TTL = 3600  # seconds, while queued
+INFLIGHT_LEASE_TTL = 300  # seconds, while running
+
+# KEYS[1] = job queue, KEYS[2..n] = inflight keys
+# ARGV[1] = TTL, ARGV[2..n] = job payload for the matching inflight key
+_ENQUEUE_ONCE_LUA = """
+local queued = 0
+for i = 2, #KEYS do
+    if redis.call('SET', KEYS[i], '1', 'NX', 'EX', ARGV[1]) then
+        redis.call('LPUSH', KEYS[1], ARGV[i])
+        queued = queued + 1
+    end
+end
+return queued
+"""
+_enqueue_once_script = get_redis().register_script(_ENQUEUE_ONCE_LUA)
+
+
+async def enqueue_once(document_ids: list[str]) -> int:
+    """
+    Atomically queue OCR jobs for documents not already queued or running,
+    in one round trip. Returns how many jobs were queued.
+    """
+    if not document_ids:
+        return 0
+    return await _enqueue_once_script(
+        keys=[QUEUE_NAME, *(INFLIGHT_PREFIX + document_id for document_id in document_ids)],
+        args=[INFLIGHT_TTL, *(_ocr_job(document_id) for document_id in document_ids)],
+    )
+
+
+async def enqueue_ocr_job(document_id: str) -> bool:
+    """Queue one OCR job; False if the document is already queued or running."""
+    return await enqueue_once([document_id]) == 1
+
+
+async def enqueue_ocr_jobs_bulk(document_ids: list[str]) -> int:
+    """Queue many OCR jobs with a single script call (one round trip)."""
+    return await enqueue_once(document_ids)
+
+
+async def is_job_inflight(document_id: str) -> bool:
+    """True while the document's job is queued or its worker lease is held."""
+    return bool(await get_redis().exists(INFLIGHT_PREFIX + document_id))
+
+
+def get_queue_redis() -> redis.Redis:
+    return redis.Redis(connection_pool=_queue_pool)
+
+
+def get_cache_redis() -> redis.Redis:
+    return redis.Redis(connection_pool=_cache_pool)
+
+
+def pool_stats() -> dict:
+    """Connection counts per sync pool, for logging."""
+    return {
+        name: {
+            "created": pool._created_connections,
+            "in_use": len(pool._in_use_connections),
+            "max": pool.max_connections,
+        }
+        for name, pool in (("queue", _queue_pool), ("cache", _cache_pool))
+    }
 
 
 def dequeue_job(timeout: int = 5) -> dict | None:
-    r = get_sync_redis()
-    result = r.brpop(QUEUE_NAME, timeout=timeout)
-    r.close()
+    result = get_queue_redis().brpop(QUEUE_NAME, timeout=timeout)
     if result is None:
         return None
     _, job_data = result
-    return json.loads(job_data)
+    return orjson.loads(job_data)
+
+
+def _rpop_many(r: redis.Redis, name: str, count: int) -> list[str]:
+    """
+    Pop up to count items in one round trip. A pipeline of plain RPOPs rather
+    than RPOP with a count, which needs Redis 6.2+ (the Spaces image uses the
+    distribution's redis-server).
+    """
+    if count <= 0:
+        return []
+    with r.pipeline(transaction=False) as pipe:
+        for _ in range(count):
+            pipe.rpop(name)
+        return [item for item in pipe.execute() if item is not None]
+
+
+def dequeue_jobs(max_count: int = 4, timeout: int = 5) -> list[dict]:
+    """
+    Block until at least one job is queued, then drain up to max_count jobs.
+    Two round trips regardless of backlog: BRPOP to wait, pipelined RPOPs to drain.
+    Keep max_count small: drained jobs are invisible to other workers and are
+    only put back on a graceful shutdown.
+    """
+    r = get_queue_redis()
+    result = r.brpop(QUEUE_NAME, timeout=timeout)
+    if result is None:
+        return []
+    jobs = [result[1]]
+    jobs.extend(_rpop_many(r, QUEUE_NAME, max_count - 1))
+    return [orjson.loads(job_data) for job_data in jobs]
+
+
+def renew_job_lease(document_id: str):
+    """Mark a job as running; call when it starts and periodically while it runs."""
+    get_queue_redis().set(INFLIGHT_PREFIX + document_id, "1", ex=INFLIGHT_LEASE_TTL)
+
+
+def mark_job_done(document_id: str):
+    """Clear the enqueue-once guard so the document can be queued again."""
+    get_queue_redis().delete(INFLIGHT_PREFIX + document_id)
+
+
+def requeue_jobs(jobs: list[dict]):
+    """Put unprocessed jobs back at the consuming end, preserving their order."""
+    if jobs:
+        get_queue_redis().rpush(QUEUE_NAME, *(orjson.dumps(job) for job in reversed(jobs)))
+
+
+# --- AI batch analysis (worker side) ---
+
+
+def enqueue_ai_batch_document(document_id: str):
+    get_queue_redis().lpush(AI_BATCH_QUEUE_NAME, document_id)
+
+
+def dequeue_ai_batch_documents(max_items: int = 100) -> list[str]:
+    """Pop up to max_items queued document IDs in one round trip."""
+    return _rpop_many(get_queue_redis(), AI_BATCH_QUEUE_NAME, max_items)
+
+
+def requeue_ai_batch_documents(document_ids: list[str]):
+    """Put document IDs back at the consuming end after a failed batch submission."""
+    if document_ids:
+        get_queue_redis().rpush(AI_BATCH_QUEUE_NAME, *reversed(document_ids))
+
+
+def add_pending_ai_batch(batch_id: str):
+    get_queue_redis().sadd(AI_BATCH_PENDING_SET, batch_id)
+
+
+def get_pending_ai_batches() -> list[str]:
+    return list(get_queue_redis().smembers(AI_BATCH_PENDING_SET))
+
+
+def remove_pending_ai_batch(batch_id: str):
+    get_queue_redis().srem(AI_BATCH_PENDING_SET, batch_id)
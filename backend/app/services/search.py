@@ -7,18 +7,53 @@ Supports two backends:
 
 from __future__ import annotations
 
+import asyncio
+import functools
 import logging
 import re
-from typing import Any
+import time
+from collections import Counter, OrderedDict
+from datetime import date, timedelta
+from typing import Any, Iterable
+
+import orjson
 
 from app.config import settings
+from app.services.queue import get_cache_redis, get_redis
 
 if settings.search_backend != "postgresql":
-    from opensearchpy import OpenSearch
+    from opensearchpy import AIOHttpConnection, AsyncOpenSearch, OpenSearch
+    from opensearchpy.exceptions import SerializationError
+    from opensearchpy.helpers import async_bulk, bulk
+    from opensearchpy.serializer import JSONSerializer
+
+    class OrjsonSerializer(JSONSerializer):
+        """JSONSerializer backed by orjson; falls back to its default() for other types."""
+
+        def loads(self, s):
+            try:
+                return orjson.loads(s)
+            except orjson.JSONDecodeError as e:
+                raise SerializationError(s, e)
+
+        def dumps(self, data):
+            if isinstance(data, str):
+                return data
+            try:
+                return orjson.dumps(data, default=self.default).decode()
+            except TypeError as e:
+                raise SerializationError(data, e)
 
 logger = logging.getLogger(__name__)
 
 INDEX_NAME = settings.opensearch_index
+REFRESH_INTERVAL = "1s"
+# Bulk calls at least this large (backfills, reindexing) pause refreshes while they run
+BULK_MODE_MIN_DOCS = 1000
+
+# Filenames are mostly IDs and timestamps, where kuromoji only produces junk tokens.
+# The cjk analyzer keeps Latin words and digits whole and bigrams Japanese text.
+FILENAME_TEXT_FIELD = {"type": "text", "analyzer": "cjk"}
 
 # Index mapping with kuromoji analyzer for Japanese text
 INDEX_SETTINGS = {
@@ -55,16 +90,15 @@ INDEX_SETTINGS = {
             },
         },
         "number_of_shards": 1,
-        "number_of_replicas": 0,
+        "number_of_replicas": 0,  # single-node dev; raise for a multi-node cluster
+        "refresh_interval": REFRESH_INTERVAL,
     },
     "mappings": {
         "properties": {
             "document_id": {"type": "keyword"},
             "original_filename": {
-                "type": "text",
-                "analyzer": "ja_analyzer",
-                "search_analyzer": "ja_search_analyzer",
-                "fields": {"keyword": {"type": "keyword"}},
+                "type": "keyword",
+                "fields": {"text": FILENAME_TEXT_FIELD},
             },
             "content_type": {"type": "keyword"},
             "ocr_text": {
@@ -98,25 +132,104 @@ INDEX_SETTINGS = {
 }
 
 
+# One client per process so the urllib3 keep-alive pool is shared by all calls
+@functools.lru_cache(maxsize=1)
 def get_client() -> OpenSearch:
     return OpenSearch(
         hosts=[settings.opensearch_url],
         use_ssl=False,
         verify_certs=False,
+        http_compress=True,
+        pool_maxsize=32,
+        timeout=10,
+        max_retries=3,
+        retry_on_timeout=True,
+        serializer=OrjsonSerializer(),
     )
 
 
+# Request-path client: FastAPI handlers await it instead of blocking the event loop.
+# The sync client above stays for the worker (indexing) and index setup.
+@functools.lru_cache(maxsize=1)
+def get_async_client() -> AsyncOpenSearch:
+    return AsyncOpenSearch(
+        hosts=[settings.opensearch_url],
+        use_ssl=False,
+        verify_certs=False,
+        connection_class=AIOHttpConnection,
+        http_compress=True,
+        maxsize=32,
+        timeout=10,
+        max_retries=3,
+        retry_on_timeout=True,
+        serializer=OrjsonSerializer(),
+    )
+
+
+async def close_async_client():
+    if get_async_client.cache_info().currsize:
+        await get_async_client().close()
+
+
+_index_ensured = False
+
+
 def ensure_index():
-    """Create the search index if it doesn't exist."""
+    """Create the search index if it doesn't exist (once per process)."""
+    global _index_ensured
+    if _index_ensured:
+        return
     client = get_client()
     if not client.indices.exists(index=INDEX_NAME):
         client.indices.create(index=INDEX_NAME, body=INDEX_SETTINGS)
         logger.info(f"Created OpenSearch index: {INDEX_NAME}")
     else:
+        # Restore the interval on indexes left with a different one
+        client.indices.put_settings(
+            index=INDEX_NAME, body={"index": {"refresh_interval": REFRESH_INTERVAL}}
+        )
+        _add_filename_text_field(client)
         logger.info(f"OpenSearch index already exists: {INDEX_NAME}")
+    _index_ensured = True
 
 
-def index_document(
+def _add_filename_text_field(client: OpenSearch):
+    """
+    Add the original_filename.text subfield to indexes created without it.
+    A field's type cannot change in place, but a subfield can be added; the
+    existing documents are then re-indexed in place to populate it.
+    """
+    mappings = client.indices.get_mapping(index=INDEX_NAME)
+    properties = next(iter(mappings.values()))["mappings"].get("properties", {})
+    field = properties.get("original_filename")
+    if field is None or "text" in field.get("fields", {}):
+        return
+    field = {**field, "fields": {**field.get("fields", {}), "text": FILENAME_TEXT_FIELD}}
+    client.indices.put_mapping(
+        index=INDEX_NAME, body={"properties": {"original_filename": field}}
+    )
+    # Runs as a background task; filename matches fill in as documents are rewritten
+    task = client.update_by_query(
+        index=INDEX_NAME, conflicts="proceed", wait_for_completion=False
+    )
+    logger.info(f"Added original_filename.text, populating it in task {task.get('task')}")
+
+
+def set_bulk_mode(enable: bool):
+    """Pause index refreshes during bulk ingest; refresh once when it ends."""
+    client = get_client()
+    client.indices.put_settings(
+        index=INDEX_NAME,
+        body={"index": {"refresh_interval": "-1" if enable else REFRESH_INTERVAL}},
+    )
+    if not enable:
+        client.indices.refresh(index=INDEX_NAME)
+
+
+_ENTITY_KEYS = ("people", "organizations", "dates", "amounts", "references")
+
+
+def _build_doc_body(
     document_id: str,
     original_filename: str,
     content_type: str,
@@ -130,44 +243,265 @@ def index_document(
     page_count: int | None,
     file_size: int,
     created_at: str,
-):
-    """Index or update a document in OpenSearch."""
-    client = get_client()
-
-    doc_body = {
+) -> dict:
+    """Build the OpenSearch source document for one row, omitting empty fields."""
+    ents = entities or {}
+    candidate = {
         "document_id": document_id,
         "original_filename": original_filename,
         "content_type": content_type,
-        "ocr_text": ocr_text or "",
-        "summary": summary or "",
+        "ocr_text": ocr_text,
+        "summary": summary,
         "category": category,
-        "tags": tags or [],
-        "entities_people": (entities or {}).get("people", []),
-        "entities_organizations": (entities or {}).get("organizations", []),
-        "entities_dates": (entities or {}).get("dates", []),
-        "entities_amounts": (entities or {}).get("amounts", []),
-        "entities_references": (entities or {}).get("references", []),
-        "key_points": key_points or [],
+        "tags": tags,
+        **{f"entities_{k}": ents.get(k) for k in _ENTITY_KEYS},
+        "key_points": key_points,
         "document_date": document_date,
         "page_count": page_count,
         "file_size": file_size,
         "created_at": created_at,
     }
+    # Missing fields behave like empty ones in queries, filters and aggregations
+    return {k: v for k, v in candidate.items() if v not in (None, [], "")}
+
+
+def index_document(**fields):
+    """Index or update a document in OpenSearch. Takes the _build_doc_body fields."""
+    doc_body = _build_doc_body(**fields)
+    get_client().index(
+        index=INDEX_NAME, id=doc_body["document_id"], body=doc_body, refresh="wait_for"
+    )
+    bump_search_generation()
+    logger.info(f"Indexed document {doc_body['document_id']} in OpenSearch")
 
-    client.index(index=INDEX_NAME, id=document_id, body=doc_body)
-    logger.info(f"Indexed document {document_id} in OpenSearch")
+
+def bulk_index_documents(docs: list[dict]) -> int:
+    """
+    Index many documents through the _bulk API (500 per request).
+    Each item takes the same fields as index_document. Returns the number indexed.
+    Returns once the documents are searchable.
+    """
+    actions = (
+        {
+            "_op_type": "index",
+            "_index": INDEX_NAME,
+            "_id": d["document_id"],
+            "_source": _build_doc_body(**d),
+        }
+        for d in docs
+    )
+    if len(docs) >= BULK_MODE_MIN_DOCS:
+        # Large backfill: no refreshes while it runs, one when it ends
+        set_bulk_mode(True)
+        try:
+            indexed, _ = bulk(get_client(), actions, chunk_size=500, request_timeout=60)
+        finally:
+            set_bulk_mode(False)
+    else:
+        indexed, _ = bulk(
+            get_client(), actions, chunk_size=500, request_timeout=60, refresh="wait_for"
+        )
+    bump_search_generation()
+    logger.info(f"Bulk indexed {indexed} document(s) in OpenSearch")
+    return indexed
 
 
-def delete_document(document_id: str):
+async def delete_document(document_id: str):
     """Remove a document from the search index."""
-    client = get_client()
+    await bulk_delete_documents([document_id])
+
+
+async def bulk_delete_documents(document_ids: list[str]):
+    """Remove many documents from the search index in one _bulk request."""
+    if not document_ids:
+        return
+    actions = ({"_op_type": "delete", "_index": INDEX_NAME, "_id": i} for i in document_ids)
+    # Missing documents come back as per-item errors, which are fine to ignore
+    await async_bulk(get_async_client(), actions, raise_on_error=False, refresh="wait_for")
+    await bump_search_generation_async()
+
+
+# --- Search result cache ---
+# Results are cached per API process for a short TTL. Every index change bumps a
+# generation counter in Redis (the worker indexes from another process), and the
+# generation is part of the cache key, so a change makes older entries unreachable.
+# Writers bump it only once the change is searchable, so a search that runs
+# between the write and the refresh cannot be cached under the new generation.
+
+SEARCH_CACHE_TTL = 30  # seconds
+SEARCH_CACHE_SIZE = 1024
+SEARCH_GENERATION_KEY = "ocrcheck:search-generation"
+
+_search_cache: OrderedDict[tuple, tuple[dict, float]] = OrderedDict()
+# Facets depend on the query and filters but not on the page, so pagination reuses them
+_facet_cache: OrderedDict[tuple, tuple[dict, float]] = OrderedDict()
+
+
+def _cache_get(cache: OrderedDict, key: tuple):
+    cached = cache.get(key)
+    if cached and cached[1] > time.monotonic():
+        cache.move_to_end(key)
+        return cached[0]
+    return None
+
+
+def _cache_put(cache: OrderedDict, key: tuple, value: dict):
+    # Callers only serialize cached results, so the dict is shared as-is
+    cache[key] = (value, time.monotonic() + SEARCH_CACHE_TTL)
+    cache.move_to_end(key)
+    while len(cache) > SEARCH_CACHE_SIZE:
+        cache.popitem(last=False)
+
+
+def bump_search_generation():
+    try:
+        get_cache_redis().incr(SEARCH_GENERATION_KEY)
+    except Exception as e:
+        logger.warning(f"Search cache invalidation failed: {e}")
+
+
+async def bump_search_generation_async():
+    try:
+        await get_redis().incr(SEARCH_GENERATION_KEY)
+    except Exception as e:
+        logger.warning(f"Search cache invalidation failed: {e}")
+
+
+async def _search_generation(popular_filters: tuple | None = None) -> str | None:
+    """
+    Current index generation, or None (no caching) if Redis is unavailable.
+    When popular_filters is given, the search is also counted for cache warming
+    in the same round trip.
+    """
     try:
-        client.delete(index=INDEX_NAME, id=document_id)
-    except Exception:
-        pass  # Ignore if not found
+        if popular_filters is None:
+            return await get_redis().get(SEARCH_GENERATION_KEY) or "0"
+        key = _popular_key(date.today())
+        async with get_redis().pipeline(transaction=False) as pipe:
+            pipe.get(SEARCH_GENERATION_KEY)
+            pipe.zincrby(key, 1, orjson.dumps(popular_filters).decode())
+            pipe.expire(key, POPULAR_SEARCH_KEY_TTL)
+            generation, *_ = await pipe.execute()
+        return generation or "0"
+    except Exception as e:
+        logger.warning(f"Search cache generation lookup failed: {e}")
+        return None
+
+
+# --- Popular search cache ---
+# First-page searches are counted per day in Redis. A background task in each API
+# process precomputes the most frequent recent ones into a cache that goes stale
+# when the index generation changes or after one warming interval, so the
+# searches that dominate traffic never start cold.
+
+POPULAR_SEARCH_PREFIX = "ocrcheck:popular-searches:"
+POPULAR_SEARCH_KEY_TTL = 3 * 86400  # seconds
+POPULAR_SEARCH_TOP_K = 100
+POPULAR_SEARCH_LIMIT = 20  # the default page size, which is what the UI requests
+POPULAR_SEARCH_WARM_INTERVAL = 300  # seconds
+POPULAR_SEARCH_TTL = POPULAR_SEARCH_WARM_INTERVAL
+
+# filters -> (generation, result, expiry on the monotonic clock)
+_popular_cache: dict[tuple, tuple[str, dict, float]] = {}
+
+
+def _popular_key(day: date) -> str:
+    return f"{POPULAR_SEARCH_PREFIX}{day:%Y%m%d}"
+
+
+async def warm_popular_searches() -> int:
+    """Recompute stale results for today's and yesterday's top searches. Returns the count."""
+    global _popular_cache
+    generation = await _search_generation()
+    if generation is None:
+        return 0
+    today = date.today()
+    counts: Counter[str] = Counter()
+    for day in (today, today - timedelta(days=1)):
+        top = await get_redis().zrevrange(
+            _popular_key(day), 0, POPULAR_SEARCH_TOP_K - 1, withscores=True
+        )
+        for member, score in top:
+            counts[member] += score
+
+    warmed = 0
+    popular: dict[tuple, tuple[str, dict, float]] = {}
+    for member, _ in counts.most_common(POPULAR_SEARCH_TOP_K):
+        query, category, tags, date_from, date_to = orjson.loads(member)
+        filters = (query, category, tuple(tags), date_from, date_to)
+        entry = _popular_cache.get(filters)
+        # Entries expire after one warming interval, so each round refreshes them
+        if entry is None or entry[0] != generation or entry[2] <= time.monotonic():
+            result = await _execute_search(filters, 0, POPULAR_SEARCH_LIMIT, generation)
+            entry = (generation, result, time.monotonic() + POPULAR_SEARCH_TTL)
+            warmed += 1
+        popular[filters] = entry
+    _popular_cache = popular
+    return warmed
+
+
+async def run_popular_search_warmer():
+    """Keep the popular search cache warm; runs until cancelled."""
+    while True:
+        try:
+            warmed = await warm_popular_searches()
+            if warmed:
+                logger.info(f"Warmed {warmed} popular search(es)")
+        except Exception as e:
+            logger.warning(f"Popular search warming failed: {e}")
+        await asyncio.sleep(POPULAR_SEARCH_WARM_INTERVAL)
+
+
+# Static parts of the search request, built once and shared (never mutated)
+_SEARCH_FIELDS = [
+    "ocr_text^1",
+    "summary^2",
+    "original_filename.text^3",
+    "key_points^1.5",
+]
+_SORT = [
+    {"_score": {"order": "desc"}},
+    {"created_at": {"order": "desc"}},
+]
+# Without a full-text clause every hit scores the same, so only the date matters
+_SORT_BY_DATE = [
+    {"created_at": {"order": "desc"}},
+]
+_HIGHLIGHT = {
+    "fields": {
+        "ocr_text": {"fragment_size": 150, "number_of_fragments": 3},
+        "summary": {"fragment_size": 200, "number_of_fragments": 1},
+        "key_points": {"fragment_size": 150, "number_of_fragments": 2},
+    },
+    "pre_tags": ["<mark>"],
+    "post_tags": ["</mark>"],
+}
+# Hit fields the search page renders; OCR text excerpts come from highlight instead
+_SOURCE = {
+    "includes": [
+        "document_id",
+        "original_filename",
+        "content_type",
+        "summary",
+        "category",
+        "tags",
+        "entities_people",
+        "entities_organizations",
+        "document_date",
+        "page_count",
+        "file_size",
+        "created_at",
+    ],
+}
+# msearch header line, serialized once; the serializer passes strings through as-is
+_MSEARCH_HEADER = orjson.dumps({"index": INDEX_NAME}).decode()
+_AGGS = {
+    "categories": {"terms": {"field": "category", "size": 20}},
+    "tags": {"terms": {"field": "tags", "size": 50}},
+}
 
 
-def search_documents(
+async def search_documents(
     query: str | None = None,
     category: str | None = None,
     tags: list[str] | None = None,
@@ -180,8 +514,79 @@ def search_documents(
     Full-text search with filters.
     Returns: {"hits": [...], "total": int, "facets": {...}}
     """
-    client = get_client()
+    filters = (query, category, tuple(sorted(tags or ())), date_from, date_to)
+    # Later pages are not counted: they are only reached through the first page
+    generation = await _search_generation(filters if skip == 0 else None)
+    if generation is not None:
+        if skip == 0 and limit == POPULAR_SEARCH_LIMIT:
+            popular = _popular_cache.get(filters)
+            if (
+                popular is not None
+                and popular[0] == generation
+                and popular[2] > time.monotonic()
+            ):
+                return popular[1]
+        cached = _cache_get(_search_cache, (generation, *filters, skip, limit))
+        if cached is not None:
+            return cached
+    return await _execute_search(filters, skip, limit, generation)
+
+
+async def _execute_search(
+    filters: tuple, skip: int, limit: int, generation: str | None
+) -> dict[str, Any]:
+    """Run a search against OpenSearch and store the result in the LRU cache."""
+    query, category, tags, date_from, date_to = filters
+    search_query, scored = _build_query(query, category, list(tags), date_from, date_to)
+    hit_body = {
+        "query": search_query,
+        "from": skip,
+        "size": limit,
+        "sort": _SORT if scored else _SORT_BY_DATE,
+        "highlight": _HIGHLIGHT,
+        "_source": _SOURCE,
+        # Exact counting stops here; larger totals are reported as the cap
+        "track_total_hits": 10000,
+    }
+    client = get_async_client()
+    facets = _cache_get(_facet_cache, (generation, *filters)) if generation is not None else None
+
+    if facets is None and skip == 0:
+        # Hits and facets as two searches in one round trip, executed in parallel
+        agg_body = {"query": search_query, "size": 0, "track_total_hits": False, "aggs": _AGGS}
+        response = await client.msearch(
+            body=[_MSEARCH_HEADER, hit_body, _MSEARCH_HEADER, agg_body]
+        )
+        hit_result, agg_result = response["responses"]
+        for r in (hit_result, agg_result):
+            if "error" in r:
+                raise RuntimeError(f"OpenSearch search failed: {r['error']}")
+        facets = _format_facets(agg_result)
+        if generation is not None:
+            _cache_put(_facet_cache, (generation, *filters), facets)
+    else:
+        # Later pages reuse cached facets but never compute them: the client keeps
+        # the facets it received with the first page
+        hit_result = await client.search(index=INDEX_NAME, body=hit_body)
+
+    result = {
+        "hits": _format_hits(hit_result),
+        "total": hit_result["hits"]["total"]["value"],
+        "facets": facets or {},
+    }
+    if generation is not None:
+        _cache_put(_search_cache, (generation, *filters, skip, limit), result)
+    return result
 
+
+def _build_query(
+    query: str | None,
+    category: str | None,
+    tags: list[str] | None,
+    date_from: str | None,
+    date_to: str | None,
+) -> tuple[dict, bool]:
+    """The query clause, and whether it is scored (has a full-text part)."""
     must_clauses = []
     filter_clauses = []
 
@@ -190,12 +595,7 @@ def search_documents(
         must_clauses.append({
             "multi_match": {
                 "query": query,
-                "fields": [
-                    "ocr_text^1",
-                    "summary^2",
-                    "original_filename^3",
-                    "key_points^1.5",
-                ],
+                "fields": _SEARCH_FIELDS,
                 "type": "best_fields",
                 "fuzziness": "AUTO",
             }
@@ -220,62 +620,41 @@ def search_documents(
         filter_clauses.append({"range": {"document_date": date_range}})
 
     # Build query
-    if not must_clauses and not filter_clauses:
-        search_query: dict = {"match_all": {}}
-    else:
-        bool_query: dict = {}
-        if must_clauses:
-            bool_query["must"] = must_clauses
+    if must_clauses:
+        bool_query: dict = {"must": must_clauses}
         if filter_clauses:
             bool_query["filter"] = filter_clauses
-        search_query = {"bool": bool_query}
+        return {"bool": bool_query}, True
+    if filter_clauses:
+        # Filter-only: skip scoring entirely and let the filter bitsets be cached
+        return {"constant_score": {"filter": {"bool": {"filter": filter_clauses}}}}, False
+    return {"match_all": {}}, False
 
-    search_body = {
-        "query": search_query,
-        "from": skip,
-        "size": limit,
-        "sort": [
-            {"_score": {"order": "desc"}},
-            {"created_at": {"order": "desc"}},
-        ],
-        "highlight": {
-            "fields": {
-                "ocr_text": {"fragment_size": 150, "number_of_fragments": 3},
-                "summary": {"fragment_size": 200, "number_of_fragments": 1},
-                "key_points": {"fragment_size": 150, "number_of_fragments": 2},
-            },
-            "pre_tags": ["<mark>"],
-            "post_tags": ["</mark>"],
-        },
-        "aggs": {
-            "categories": {"terms": {"field": "category", "size": 20}},
-            "tags": {"terms": {"field": "tags", "size": 50}},
-        },
-    }
-
-    result = client.search(index=INDEX_NAME, body=search_body)
 
+def _format_hits(result: dict) -> list[dict]:
     hits = []
     for hit in result["hits"]["hits"]:
         source = hit["_source"]
         source["_score"] = hit.get("_score")
         source["_highlights"] = hit.get("highlight", {})
         hits.append(source)
+    return hits
 
-    total = result["hits"]["total"]["value"]
 
-    facets = {}
-    if "aggregations" in result:
-        facets["categories"] = [
+def _format_facets(result: dict) -> dict:
+    aggregations = result.get("aggregations")
+    if not aggregations:
+        return {}
+    return {
+        "categories": [
             {"key": b["key"], "count": b["doc_count"]}
-            for b in result["aggregations"]["categories"]["buckets"]
-        ]
-        facets["tags"] = [
+            for b in aggregations["categories"]["buckets"]
+        ],
+        "tags": [
             {"key": b["key"], "count": b["doc_count"]}
-            for b in result["aggregations"]["tags"]["buckets"]
-        ]
-
-    return {"hits": hits, "total": total, "facets": facets}
+            for b in aggregations["tags"]["buckets"]
+        ],
+    }
 
 
 # ---------------------------------------------------------------------------
@@ -298,41 +677,49 @@ def _get_pg_session():
     return _pg_session_factory()
 
 
+# Filter, sort and facet support for pg_search_documents. The trigram index is
+# partial: rows without search_text can never match a text query.
+_PG_INDEX_DDL = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS idx_documents_search_text_trgm_active "
+    "ON documents USING gin (search_text gin_trgm_ops) WHERE search_text IS NOT NULL",
+    "DROP INDEX IF EXISTS idx_documents_search_text_trgm",
+    "CREATE INDEX IF NOT EXISTS idx_documents_category ON documents (category)",
+    "CREATE INDEX IF NOT EXISTS idx_documents_doc_date ON documents (document_date)",
+    "CREATE INDEX IF NOT EXISTS idx_documents_created_at ON documents (created_at DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_documents_tags_gin "
+    "ON documents USING gin (tags jsonb_path_ops)",
+)
+_pg_index_ensured = False
+
+
 def pg_ensure_index():
-    """Create pg_trgm extension and GIN index on search_text."""
+    """Create pg_trgm extension and the search indexes (once per process)."""
+    global _pg_index_ensured
+    if _pg_index_ensured:
+        return
     from sqlalchemy import text
 
     db = _get_pg_session()
     try:
-        db.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
-        db.execute(text(
-            "CREATE INDEX IF NOT EXISTS idx_documents_search_text_trgm "
-            "ON documents USING gin (search_text gin_trgm_ops)"
-        ))
+        for ddl in _PG_INDEX_DDL:
+            db.execute(text(ddl))
         db.commit()
-        logger.info("PostgreSQL pg_trgm index ensured")
+        _pg_index_ensured = True
+        logger.info("PostgreSQL pg_trgm and filter indexes ensured")
     finally:
         db.close()
 
 
-def pg_index_document(
-    document_id: str,
+def _build_search_text(
     original_filename: str,
-    content_type: str,
     ocr_text: str | None,
     summary: str | None,
-    category: str | None,
     tags: list[str] | None,
-    entities: dict | None,
     key_points: list[str] | None,
-    document_date: str | None,
-    page_count: int | None,
-    file_size: int,
-    created_at: str,
-):
-    """Update search_text column for a document."""
-    from sqlalchemy import text
-
+    **_,
+) -> str:
+    """Concatenate the searchable fields into the search_text column value."""
     parts = [
         original_filename or "",
         ocr_text or "",
@@ -342,56 +729,143 @@ def pg_index_document(
         parts.extend(key_points)
     if tags:
         parts.extend(tags)
-    search_text = "\n".join(p for p in parts if p)
+    return "\n".join(p for p in parts if p)
+
+
+_PG_UPDATE_SEARCH_TEXT = "UPDATE documents SET search_text = :st WHERE id = :did"
+
+
+def pg_index_document(**fields):
+    """Update search_text column for a document. Takes the _build_doc_body fields."""
+    from sqlalchemy import text
 
     db = _get_pg_session()
     try:
         db.execute(
-            text("UPDATE documents SET search_text = :st WHERE id = :did"),
-            {"st": search_text, "did": document_id},
+            text(_PG_UPDATE_SEARCH_TEXT),
+            {"st": _build_search_text(**fields), "did": fields["document_id"]},
         )
         db.commit()
-        logger.info(f"Indexed document {document_id} in PostgreSQL search_text")
+        logger.info(f"Indexed document {fields['document_id']} in PostgreSQL search_text")
+    finally:
+        db.close()
+
+
+def pg_bulk_index_documents(docs: Iterable[dict]) -> int:
+    """Update search_text for many documents in one executemany and one commit."""
+    from sqlalchemy import text
+
+    params = [{"st": _build_search_text(**d), "did": d["document_id"]} for d in docs]
+    if not params:
+        return 0
+    db = _get_pg_session()
+    try:
+        db.execute(text(_PG_UPDATE_SEARCH_TEXT), params)
+        db.commit()
+        logger.info(f"Bulk indexed {len(params)} document(s) in PostgreSQL search_text")
     finally:
         db.close()
+    return len(params)
 
 
 def pg_delete_document(document_id: str):
     """Clear search_text for a document."""
+    pg_delete_documents([document_id])
+
+
+def pg_delete_documents(document_ids: list[str]):
+    """Clear search_text for many documents in one statement."""
     from sqlalchemy import text
 
+    if not document_ids:
+        return
     db = _get_pg_session()
     try:
         db.execute(
-            text("UPDATE documents SET search_text = NULL WHERE id = :did"),
-            {"did": document_id},
+            text("UPDATE documents SET search_text = NULL WHERE id = ANY(CAST(:dids AS uuid[]))"),
+            {"dids": document_ids},
         )
         db.commit()
     finally:
         db.close()
 
 
+@functools.lru_cache(maxsize=256)
+def _compile_hl(query: str) -> re.Pattern:
+    return re.compile(re.escape(query), re.IGNORECASE)
+
+
+def _find_spans(text_content: str, query: str):
+    """Yield (start, end) of successive case-insensitive matches of query."""
+    if query.isascii():
+        # Plain str.find is much cheaper than the regex engine; only usable when
+        # lowercasing keeps character offsets aligned with the original text
+        low = text_content.lower()
+        if len(low) == len(text_content):
+            q = query.lower()
+            idx = low.find(q)
+            while idx != -1:
+                yield idx, idx + len(q)
+                idx = low.find(q, idx + len(q))
+            return
+    for match in _compile_hl(query).finditer(text_content):
+        yield match.span()
+
+
 def _highlight_text(text_content: str, query: str, context_chars: int = 75) -> list[str]:
-    """Generate highlighted snippets around query matches."""
+    """Generate up to 3 highlighted snippets around query matches (single scan)."""
     if not text_content or not query:
         return []
+    text_len = len(text_content)
+    matches = _find_spans(text_content, query)
+    spans: list[tuple[int, int]] = []
     fragments = []
-    pattern = re.compile(re.escape(query), re.IGNORECASE)
-    for match in pattern.finditer(text_content):
-        start = max(0, match.start() - context_chars)
-        end = min(len(text_content), match.end() + context_chars)
-        snippet = text_content[start:end]
-        snippet = pattern.sub(lambda m: f"<mark>{m.group()}</mark>", snippet)
-        if start > 0:
-            snippet = "..." + snippet
-        if end < len(text_content):
-            snippet = snippet + "..."
-        fragments.append(snippet)
-        if len(fragments) >= 3:
-            break
+    for i in range(3):
+        if i == len(spans):
+            span = next(matches, None)
+            if span is None:
+                break
+            spans.append(span)
+        start = max(0, spans[i][0] - context_chars)
+        end = min(text_len, spans[i][1] + context_chars)
+        # Read ahead so every match inside this window gets marked
+        while spans[-1][1] <= end:
+            span = next(matches, None)
+            if span is None:
+                break
+            spans.append(span)
+
+        parts = ["..."] if start > 0 else []
+        pos = start
+        for m_start, m_end in spans:
+            if m_start >= start and m_end <= end:
+                parts += [
+                    text_content[pos:m_start], "<mark>", text_content[m_start:m_end], "</mark>"
+                ]
+                pos = m_end
+        parts.append(text_content[pos:end])
+        if end < text_len:
+            parts.append("...")
+        fragments.append("".join(parts))
     return fragments
 
 
+# Total and facets over the "filtered" CTE, as uncorrelated subqueries that
+# PostgreSQL evaluates once per statement
+_PG_SEARCH_AGGREGATES = (
+    "(SELECT count(*) FROM filtered) AS total, "
+    "(SELECT coalesce(json_agg(json_build_object('key', category, 'count', n) "
+    "ORDER BY n DESC), '[]') "
+    "FROM (SELECT category, count(*) AS n FROM filtered WHERE category IS NOT NULL "
+    "GROUP BY category ORDER BY n DESC LIMIT 20) AS c) AS categories_facet, "
+    "(SELECT coalesce(json_agg(json_build_object('key', tag, 'count', n) "
+    "ORDER BY n DESC), '[]') "
+    "FROM (SELECT tag, count(*) AS n FROM filtered, "
+    "jsonb_array_elements_text(COALESCE(tags, '[]'::jsonb)) AS tag "
+    "GROUP BY tag ORDER BY n DESC LIMIT 50) AS t) AS tags_facet"
+)
+
+
 def pg_search_documents(
     query: str | None = None,
     category: str | None = None,
@@ -409,9 +883,14 @@ def pg_search_documents(
         conditions = []
         params: dict[str, Any] = {}
 
+        score = "NULL::real"
         if query and query.strip():
-            conditions.append("search_text ILIKE :q")
-            params["q"] = f"%{query.strip()}%"
+            # Exact substrings, plus near matches via trigram word similarity;
+            # both branches are answered by the gin_trgm_ops index
+            conditions.append("(search_text ILIKE :q_like OR :q <% search_text)")
+            params["q"] = query.strip()
+            params["q_like"] = f"%{query.strip()}%"
+            score = "word_similarity(:q, search_text)"
 
         if category:
             conditions.append("category = :cat")
@@ -419,7 +898,8 @@ def pg_search_documents(
 
         if tags:
             for i, tag in enumerate(tags):
-                conditions.append(f"tags::jsonb ? :tag{i}")
+                # Containment is what the jsonb_path_ops GIN index answers
+                conditions.append(f"tags @> jsonb_build_array(:tag{i})")
                 params[f"tag{i}"] = tag
 
         if date_from:
@@ -432,22 +912,33 @@ def pg_search_documents(
 
         where = " AND ".join(conditions) if conditions else "TRUE"
 
-        # Count
-        count_sql = f"SELECT count(*) FROM documents WHERE {where}"
-        total = db.execute(text(count_sql), params).scalar() or 0
-
-        # Fetch results
+        # The filter runs once into a small CTE that the page, the count and
+        # both facets read from, and everything comes back in one round trip
+        cte = (
+            f"WITH filtered AS MATERIALIZED ("
+            f"SELECT id, category, tags, created_at, {score} AS score "
+            f"FROM documents WHERE {where}) "
+        )
         fetch_sql = (
-            f"SELECT id, original_filename, content_type, ocr_text, summary, "
-            f"category, tags, entities, key_points, document_date, page_count, "
-            f"file_size, created_at "
-            f"FROM documents WHERE {where} "
-            f"ORDER BY created_at DESC "
-            f"LIMIT :lim OFFSET :off"
+            f"{cte}"
+            f"SELECT d.id, d.original_filename, d.content_type, d.ocr_text, d.summary, "
+            f"d.category, d.tags, d.entities, d.key_points, d.document_date, d.page_count, "
+            f"d.file_size, d.created_at, p.score, {_PG_SEARCH_AGGREGATES} "
+            f"FROM (SELECT id, created_at, score FROM filtered "
+            f"ORDER BY score DESC NULLS LAST, created_at DESC LIMIT :lim OFFSET :off) AS p "
+            f"JOIN documents AS d ON d.id = p.id "
+            f"ORDER BY p.score DESC NULLS LAST, p.created_at DESC"
         )
         params["lim"] = limit
         params["off"] = skip
         rows = db.execute(text(fetch_sql), params).fetchall()
+        if rows:
+            total, categories_facet, tags_facet = rows[0][14:17]
+        else:
+            # Page past the end (or no matches): aggregates still need a row
+            total, categories_facet, tags_facet = db.execute(
+                text(f"{cte}SELECT {_PG_SEARCH_AGGREGATES}"), params
+            ).one()
 
         hits = []
         for row in rows:
@@ -475,28 +966,10 @@ def pg_search_documents(
                 "file_size": row[11],
                 "document_date": row[9],
                 "created_at": row[12].isoformat() if row[12] else None,
-                "_score": None,
+                "_score": row[13],
                 "_highlights": highlights,
             })
 
-        # Facets
-        cat_sql = (
-            f"SELECT category, count(*) FROM documents "
-            f"WHERE category IS NOT NULL AND ({where}) "
-            f"GROUP BY category ORDER BY count(*) DESC LIMIT 20"
-        )
-        cat_rows = db.execute(text(cat_sql), params).fetchall()
-        categories_facet = [{"key": r[0], "count": r[1]} for r in cat_rows]
-
-        tag_sql = (
-            f"SELECT tag, count(*) FROM documents, "
-            f"jsonb_array_elements_text(COALESCE(tags, '[]'::jsonb)) AS tag "
-            f"WHERE ({where}) "
-            f"GROUP BY tag ORDER BY count(*) DESC LIMIT 50"
-        )
-        tag_rows = db.execute(text(tag_sql), params).fetchall()
-        tags_facet = [{"key": r[0], "count": r[1]} for r in tag_rows]
-
         return {
             "hits": hits,
             "total": total,
@@ -1,13 +1,40 @@
+import asyncio
+import io
 import os
-import uuid
+import shutil
+import time
+from collections import OrderedDict
+from contextlib import AsyncExitStack
 from datetime import datetime
 from pathlib import Path
+from typing import BinaryIO
 
 import aioboto3
+from boto3.s3.transfer import TransferConfig
 from botocore.config import Config
 
 from app.config import settings
 
+# Files above the threshold are sent as concurrent multipart parts, so at most
+# max_concurrency chunks are held in memory instead of the whole upload
+UPLOAD_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=10,
+    use_threads=False,
+)
+
+# "YYYY/MM" key prefix, recomputed at most every 30s since it changes once a month
+_prefix_cache: tuple[float, str] = (0.0, "")
+
+
+def _month_prefix() -> str:
+    global _prefix_cache
+    now = time.monotonic()
+    if not _prefix_cache[1] or now - _prefix_cache[0] > 30:
+        _prefix_cache = (now, f"{datetime.utcnow():%Y/%m}")
+    return _prefix_cache[1]
+
 
 class FilesystemStorageService:
     """Storage backend using the local filesystem instead of S3/MinIO."""
@@ -15,31 +42,64 @@ class FilesystemStorageService:
     def __init__(self):
         self.base_dir = Path(settings.upload_dir)
 
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
     async def ensure_bucket(self):
         self.base_dir.mkdir(parents=True, exist_ok=True)
 
     def generate_s3_key(self, original_filename: str) -> str:
-        now = datetime.utcnow()
-        unique_id = uuid.uuid4().hex[:12]
+        unique_id = os.urandom(6).hex()
         ext = original_filename.rsplit(".", 1)[-1] if "." in original_filename else "bin"
-        return f"{now.year}/{now.month:02d}/{unique_id}.{ext}"
+        return f"{_month_prefix()}/{unique_id}.{ext}"
 
-    async def upload_file(self, s3_key: str, file_data: bytes, content_type: str) -> str:
-        file_path = self.base_dir / s3_key
-        file_path.parent.mkdir(parents=True, exist_ok=True)
-        file_path.write_bytes(file_data)
+    # Disk I/O runs in a worker thread so multi-MB writes don't stall the event loop
+
+    async def upload_file(
+        self, s3_key: str, file_data: bytes | BinaryIO, content_type: str
+    ) -> str:
+        """Store bytes, or stream a file object (e.g. UploadFile.file) in chunks."""
+        if not isinstance(file_data, bytes):
+            return await self.upload_stream(s3_key, file_data, content_type)
+        await asyncio.to_thread(self.upload_file_sync, s3_key, file_data, content_type)
         return s3_key
 
-    async def get_presigned_url(self, s3_key: str, expires_in: int = 3600) -> str:
+    async def upload_stream(self, s3_key: str, fileobj: BinaryIO, content_type: str) -> str:
+        await asyncio.to_thread(self._copy_to_path, fileobj, self.base_dir / s3_key)
+        return s3_key
+
+    @staticmethod
+    def _copy_to_path(fileobj: BinaryIO, file_path: Path):
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        with file_path.open("wb") as dst:
+            shutil.copyfileobj(fileobj, dst)
+
+    def build_public_url(self, s3_key: str) -> str:
         return f"/files/{s3_key}"
 
+    async def get_presigned_url(self, s3_key: str, expires_in: int = 3600) -> str:
+        return self.build_public_url(s3_key)
+
     async def delete_file(self, s3_key: str):
-        file_path = self.base_dir / s3_key
-        if file_path.exists():
-            file_path.unlink()
+        await self.delete_files([s3_key])
+
+    async def delete_files(self, s3_keys: list[str]):
+        await asyncio.to_thread(self._unlink_all, s3_keys)
+
+    def _unlink_all(self, s3_keys: list[str]):
+        for key in s3_keys:
+            (self.base_dir / key).unlink(missing_ok=True)
 
     # Sync helpers for the OCR worker
+    def open_file(self, key: str) -> Path:
+        """Path of a stored file, for serving it with FileResponse."""
+        return self.base_dir / key
+
     def download_file_sync(self, key: str) -> bytes:
+        """Read a whole file into memory; for the OCR worker, not the HTTP path."""
         return (self.base_dir / key).read_bytes()
 
     def upload_file_sync(self, key: str, data: bytes, content_type: str):
@@ -56,7 +116,14 @@ class StorageService:
             s3={"addressing_style": "path"},
             signature_version="s3v4",
             region_name=settings.s3_region,
+            # The client is shared by all requests (and multipart parts)
+            max_pool_connections=50,
         )
+        # Long-lived clients, opened once by start() instead of per call
+        self._s3 = None
+        self._public_s3 = None
+        self._exit_stack: AsyncExitStack | None = None
+        self._start_lock = asyncio.Lock()
 
     def _get_client_kwargs(self):
         return {
@@ -66,27 +133,76 @@ class StorageService:
             "config": self.config,
         }
 
+    async def start(self):
+        """Open the S3 clients; called from the app lifespan (or lazily on first use)."""
+        async with self._start_lock:
+            if self._s3 is not None:
+                return
+            stack = AsyncExitStack()
+            self._s3 = await stack.enter_async_context(
+                self.session.client("s3", **self._get_client_kwargs())
+            )
+            self._public_s3 = await stack.enter_async_context(
+                self.session.client("s3", **self._get_public_client_kwargs())
+            )
+            self._exit_stack = stack
+
+    async def close(self):
+        if self._exit_stack is not None:
+            await self._exit_stack.aclose()
+            self._exit_stack = None
+            self._s3 = self._public_s3 = None
+
+    async def _client(self):
+        if self._s3 is None:
+            await self.start()
+        return self._s3
+
+    async def _public_client(self):
+        if self._public_s3 is None:
+            await self.start()
+        return self._public_s3
+
     async def ensure_bucket(self):
-        async with self.session.client("s3", **self._get_client_kwargs()) as s3:
-            try:
-                await s3.head_bucket(Bucket=self.bucket_name)
-            except Exception:
-                await s3.create_bucket(Bucket=self.bucket_name)
+        s3 = await self._client()
+        try:
+            await s3.head_bucket(Bucket=self.bucket_name)
+        except Exception:
+            await s3.create_bucket(Bucket=self.bucket_name)
 
     def generate_s3_key(self, original_filename: str) -> str:
-        now = datetime.utcnow()
-        unique_id = uuid.uuid4().hex[:12]
+        unique_id = os.urandom(6).hex()
         ext = original_filename.rsplit(".", 1)[-1] if "." in original_filename else "bin"
-        return f"{now.year}/{now.month:02d}/{unique_id}.{ext}"
+        return f"{_month_prefix()}/{unique_id}.{ext}"
 
-    async def upload_file(self, s3_key: str, file_data: bytes, content_type: str) -> str:
-        async with self.session.client("s3", **self._get_client_kwargs()) as s3:
-            await s3.put_object(
-                Bucket=self.bucket_name,
-                Key=s3_key,
-                Body=file_data,
-                ContentType=content_type,
-            )
+    async def upload_file(
+        self, s3_key: str, file_data: bytes | BinaryIO, content_type: str
+    ) -> str:
+        """Store bytes, or stream a file object (e.g. UploadFile.file) in chunks."""
+        if not isinstance(file_data, bytes):
+            return await self.upload_stream(s3_key, file_data, content_type)
+        if len(file_data) > UPLOAD_TRANSFER_CONFIG.multipart_threshold:
+            # Large payloads go up as parallel multipart parts
+            return await self.upload_stream(s3_key, io.BytesIO(file_data), content_type)
+        s3 = await self._client()
+        await s3.put_object(
+            Bucket=self.bucket_name,
+            Key=s3_key,
+            Body=file_data,
+            ContentType=content_type,
+        )
+        return s3_key
+
+    async def upload_stream(self, s3_key: str, fileobj: BinaryIO, content_type: str) -> str:
+        """Stream a file object to S3, switching to multipart for large files."""
+        s3 = await self._client()
+        await s3.upload_fileobj(
+            fileobj,
+            self.bucket_name,
+            s3_key,
+            ExtraArgs={"ContentType": content_type},
+            Config=UPLOAD_TRANSFER_CONFIG,
+        )
         return s3_key
 
     def _get_public_client_kwargs(self):
@@ -109,20 +225,74 @@ class StorageService:
         }
 
     async def get_presigned_url(self, s3_key: str, expires_in: int = 3600) -> str:
-        async with self.session.client("s3", **self._get_public_client_kwargs()) as s3:
-            url = await s3.generate_presigned_url(
-                "get_object",
-                Params={"Bucket": self.bucket_name, "Key": s3_key},
-                ExpiresIn=expires_in,
-            )
-        return url
+        s3 = await self._public_client()
+        return await s3.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket_name, "Key": s3_key},
+            ExpiresIn=expires_in,
+        )
 
     async def delete_file(self, s3_key: str):
-        async with self.session.client("s3", **self._get_client_kwargs()) as s3:
-            await s3.delete_object(Bucket=self.bucket_name, Key=s3_key)
+        await self.delete_files([s3_key])
+
+    async def delete_files(self, s3_keys: list[str]):
+        """Delete many objects with DeleteObjects (up to 1000 keys per request)."""
+        s3 = await self._client()
+        for i in range(0, len(s3_keys), 1000):
+            chunk = s3_keys[i:i + 1000]
+            await s3.delete_objects(
+                Bucket=self.bucket_name,
+                Delete={"Objects": [{"Key": key} for key in chunk], "Quiet": True},
+            )
+        for key in s3_keys:
+            invalidate_presigned_url(key)
 
 
 if settings.storage_backend == "filesystem":
     storage_service = FilesystemStorageService()
 else:
     storage_service = StorageService()
+
+
+# --- Presigned URL cache ---
+
+PRESIGNED_URL_EXPIRES_IN = 3600
+# Reuse a signed URL for at most this long so clients never receive one close to expiry
+PRESIGNED_URL_CACHE_TTL = min(PRESIGNED_URL_EXPIRES_IN - 60, 600)
+PRESIGNED_URL_CACHE_SIZE = 4096
+
+_presigned_url_cache: OrderedDict[str, tuple[str, float]] = OrderedDict()
+
+
+async def get_cached_presigned_url(s3_key: str) -> str:
+    """Return a presigned URL for s3_key, reusing a recently signed one when possible."""
+    if settings.storage_backend == "filesystem":
+        return storage_service.build_public_url(s3_key)
+
+    now = time.monotonic()
+    cached = _presigned_url_cache.get(s3_key)
+    if cached and cached[1] > now:
+        _presigned_url_cache.move_to_end(s3_key)
+        return cached[0]
+
+    url = await storage_service.get_presigned_url(s3_key, expires_in=PRESIGNED_URL_EXPIRES_IN)
+    _presigned_url_cache[s3_key] = (url, now + PRESIGNED_URL_CACHE_TTL)
+    _presigned_url_cache.move_to_end(s3_key)
+    while len(_presigned_url_cache) > PRESIGNED_URL_CACHE_SIZE:
+        _presigned_url_cache.popitem(last=False)
+    return url
+
+
+async def get_presigned_urls(s3_keys: list[str | None]) -> list[str | None]:
+    """Presigned URLs for many keys (None stays None), signed concurrently."""
+    if settings.storage_backend == "filesystem":
+        return [storage_service.build_public_url(k) if k else None for k in s3_keys]
+    return await asyncio.gather(*(_get_optional_url(k) for k in s3_keys))
+
+
+async def _get_optional_url(s3_key: str | None) -> str | None:
+    return await get_cached_presigned_url(s3_key) if s3_key else None
+
+
+def invalidate_presigned_url(s3_key: str):
+    _presigned_url_cache.pop(s3_key, None)
@@ -1,39 +1,167 @@
 """OCR processing using RapidOCR (ONNX Runtime) for Japanese text recognition."""
 
+import html
+import io
 import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import cv2
-from PIL import Image
+
+from app.config import settings
 
 logger = logging.getLogger(__name__)
 
 # Lazy-loaded global OCR engine instance
 _ocr_engine = None
 
+# Lazy-loaded page thread pool (only when settings.ocr_threads > 1)
+_page_pool = None
+
 # Model paths (set by Dockerfile.worker multi-stage build)
 _MODEL_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "models")
 _REC_MODEL = os.path.join(_MODEL_DIR, "japan_PP-OCRv3_rec.onnx")
+_REC_MODEL_INT8 = os.path.join(_MODEL_DIR, "japan_PP-OCRv3_rec_int8.onnx")
 _REC_DICT = os.path.join(_MODEL_DIR, "japan_dict.txt")
 
 
+# Text-line crops per recognizer run; crops from all pages of a batch are pooled,
+# so larger batches amortize the per-run overhead
+REC_BATCH_SIZE = 16
+# On a GPU a run costs little more with twice the crops
+REC_BATCH_SIZE_CUDA = 32
+
+# Pages are downscaled by an integer factor for table line detection so the
+# shorter side stays at least this many pixels
+LINE_DETECT_MIN_SIDE = 1000
+
+# Detected table lines, one field per coordinate (struct-of-arrays access)
+H_LINE_DTYPE = np.dtype(
+    [("y", np.int32), ("x1", np.int32), ("x2", np.int32), ("width", np.int32)]
+)
+V_LINE_DTYPE = np.dtype(
+    [("x", np.int32), ("y1", np.int32), ("y2", np.int32), ("height", np.int32)]
+)
+
+
 def get_ocr_engine():
     """Lazy-initialize RapidOCR engine with Japanese recognition model."""
     global _ocr_engine
     if _ocr_engine is None:
         from rapidocr_onnxruntime import RapidOCR
 
+        # RapidOCR builds its sessions with ORT_ENABLE_ALL graph optimization and
+        # sequential execution; pick the execution provider explicitly and size the
+        # thread pools so the models don't contend with the render/upload threads
+        # of the pipeline (-1 leaves ORT's default)
+        # With several page threads, each Run gets one thread: ORT doesn't split a
+        # run across threads well, concurrent runs on one session scale better
+        intra_threads = settings.ocr_intra_op_threads or (1 if settings.ocr_threads > 1 else -1)
+        inter_threads = settings.ocr_inter_op_threads or -1
+        # With CUDA, det and rec run on the GPU (RapidOCR falls back to CPU with a
+        # warning when onnxruntime-gpu isn't installed); the small angle classifier
+        # stays on CPU. The ORT-format twins are CPU-optimized, so CUDA loads .onnx
+        use_cuda = settings.ocr_device == "cuda"
+        rec_model = _REC_MODEL_INT8 if settings.ocr_rec_int8 else _REC_MODEL
+        if not use_cuda:
+            rec_model = _prefer_ort_format(rec_model)
         _ocr_engine = RapidOCR(
-            rec_model_path=_REC_MODEL,
+            rec_model_path=rec_model,
             rec_keys_path=_REC_DICT,
+            rec_batch_num=REC_BATCH_SIZE_CUDA if use_cuda else REC_BATCH_SIZE,
+            intra_op_num_threads=intra_threads,
+            inter_op_num_threads=inter_threads,
+            det_use_cuda=use_cuda,
+            cls_use_cuda=False,
+            rec_use_cuda=use_cuda,
+        )
+        logger.info(
+            "RapidOCR engine initialized (Japan PP-OCRv3 rec model "
+            f"{os.path.basename(rec_model)}, device={settings.ocr_device}, "
+            f"intra_op_threads={intra_threads}, inter_op_threads={inter_threads})"
         )
-        logger.info("RapidOCR engine initialized (Japan PP-OCRv3 rec model)")
     return _ocr_engine
 
 
-def ocr_image(img: Image.Image) -> dict:
+def _prefer_ort_format(model_path: str) -> str:
+    """
+    The model's pre-converted ORT-format twin (built in Dockerfile.worker), if present:
+    it loads without protobuf parsing or re-running the offline graph optimizations.
+    """
+    ort_path = os.path.splitext(model_path)[0] + ".ort"
+    return ort_path if os.path.exists(ort_path) else model_path
+
+
+def _map_pages(fn, items: list) -> list:
+    """
+    Apply fn to each page, on the page thread pool when one is configured.
+    ONNX Runtime and OpenCV release the GIL, so the threads run in parallel.
+    """
+    global _page_pool
+    if settings.ocr_threads <= 1 or len(items) <= 1:
+        return [fn(item) for item in items]
+    if _page_pool is None:
+        _page_pool = ThreadPoolExecutor(
+            max_workers=settings.ocr_threads, thread_name_prefix="ocr-page"
+        )
+    return list(_page_pool.map(fn, items))
+
+
+def _detect_text_lines(engine, img_array: np.ndarray) -> tuple[np.ndarray | None, list]:
+    """
+    Detection (+ angle classification) half of RapidOCR's __call__ for one page.
+    Returns the text boxes in page coordinates and the matching line crops.
     """
-    Run OCR on a single page image.
+    raw_h, raw_w = img_array.shape[:2]
+    img, ratio_h, ratio_w = engine.preprocess(img_array)
+    op_record = {"preprocess": {"ratio_h": ratio_h, "ratio_w": ratio_w}}
+    img, op_record = engine.maybe_add_letterbox(img, op_record)
+    dt_boxes, _elapse = engine.auto_text_det(img)
+    if dt_boxes is None:
+        return None, []
+    crops = engine.get_crop_img_list(img, dt_boxes)
+    if engine.use_cls:
+        crops, _cls_res, _elapse = engine.text_cls(crops)
+    return engine._get_origin_points(dt_boxes, op_record, raw_h, raw_w), crops
+
+
+def batch_ocr_images(imgs: list[np.ndarray]) -> list[dict]:
+    """
+    Run OCR on several page images, recognizing the text lines of all pages together.
+    Detection runs per page (concurrently with settings.ocr_threads > 1); the
+    crops are then pooled so the recognizer (which sorts crops by aspect ratio
+    into same-shape batches) runs once per REC_BATCH_SIZE lines instead of once
+    per small per-page remainder.
+    Returns one ocr_image() result per page.
+    """
+    engine = get_ocr_engine()
+    page_boxes = []
+    all_crops = []
+    for boxes, crops in _map_pages(lambda img: _detect_text_lines(engine, img), imgs):
+        page_boxes.append(boxes)
+        all_crops.extend(crops)
+
+    rec_res, _elapse = engine.text_rec(all_crops) if all_crops else ([], 0.0)
+
+    results = []
+    offset = 0
+    for boxes in page_boxes:
+        n = 0 if boxes is None else len(boxes)
+        page_rec = rec_res[offset:offset + n]
+        offset += n
+        keep = [i for i, (_text, score, *_rest) in enumerate(page_rec)
+                if float(score) >= engine.text_score]
+        results.append(_format_ocr_result(
+            boxes[keep] if keep else np.empty((0, 4, 2)),
+            [page_rec[i][0] for i in keep],
+            [float(page_rec[i][1]) for i in keep],
+        ))
+    return results
+
+
+def ocr_image(img: np.ndarray) -> dict:
+    """
+    Run OCR on a single RGB page array.
     Returns:
         {
             "full_text": str,
@@ -41,43 +169,54 @@ def ocr_image(img: Image.Image) -> dict:
             "confidence": float,
         }
     """
-    engine = get_ocr_engine()
-    img_array = np.array(img)
-    result, _elapse = engine(img_array)
-
-    blocks = []
-    texts = []
-    confidences = []
-
-    if result:
-        for line in result:
-            bbox_points, text, conf = line
-
-            # Convert 4-point bbox to [x_min, y_min, x_max, y_max]
-            xs = [p[0] for p in bbox_points]
-            ys = [p[1] for p in bbox_points]
-            bbox = [min(xs), min(ys), max(xs), max(ys)]
-
-            blocks.append({
-                "text": text,
-                "bbox": [round(v, 1) for v in bbox],
-                "confidence": round(conf, 4),
-            })
-            texts.append(text)
-            confidences.append(conf)
+    return batch_ocr_images([img])[0]
+
 
-    avg_confidence = sum(confidences) / len(confidences) if confidences else 0.0
+def _format_ocr_result(boxes: np.ndarray, texts: list[str], scores: list[float]) -> dict:
+    """
+    Convert RapidOCR lines (4-point boxes, texts, scores) to the ocr_image() result.
+    Bboxes and confidences are computed and rounded for the whole page at once.
+    """
+    if not texts:
+        return {"full_text": "", "blocks": [], "confidence": 0.0}
+
+    # Convert 4-point boxes (N, 4, 2) to [x_min, y_min, x_max, y_max]
+    points = np.asarray(boxes, dtype=np.float64)
+    bboxes = np.round(np.concatenate((points.min(axis=1), points.max(axis=1)), axis=1), 1)
+    confs = np.asarray(scores, dtype=np.float64)
+
+    blocks = [
+        {"text": text, "bbox": bbox, "confidence": conf}
+        for text, bbox, conf in zip(texts, bboxes.tolist(), np.round(confs, 4).tolist())
+    ]
 
     return {
         "full_text": "\n".join(texts),
         "blocks": blocks,
-        "confidence": round(avg_confidence, 4),
+        "confidence": round(float(confs.mean()), 4),
     }
 
 
-def _detect_lines(img_array: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
-    """Detect horizontal and vertical lines using morphological operations."""
-    gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY) if len(img_array.shape) == 3 else img_array
+def _line_detection_gray(img_array: np.ndarray) -> tuple[np.ndarray, int]:
+    """
+    Materialize the page once as the grayscale image line detection works on.
+    Line detection doesn't need full 300 DPI: the page is shrunk by an integer
+    factor (morphology cost scales with pixel count), returned with the gray
+    image so segments can be scaled back up. The result is C-contiguous uint8,
+    which OpenCV's vectorized threshold/morphology paths load directly.
+    """
+    h, w = img_array.shape[:2]
+    scale = max(1, min(h, w) // LINE_DETECT_MIN_SIDE)
+    small = img_array
+    if scale > 1:
+        # Shrinking the RGB page first is cheaper than converting it at full size
+        small = cv2.resize(img_array, (w // scale, h // scale), interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(small, cv2.COLOR_RGB2GRAY) if small.ndim == 3 else small
+    return np.ascontiguousarray(gray, dtype=np.uint8), scale
+
+
+def _detect_lines(gray: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Detect horizontal and vertical lines in a grayscale page using morphological operations."""
     h, w = gray.shape[:2]
 
     # Adaptive threshold for varied lighting
@@ -87,71 +226,86 @@ def _detect_lines(img_array: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
 
     # Horizontal lines: kernel width proportional to image width
     h_kernel_len = max(w // 15, 40)
-    h_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (h_kernel_len, 1))
-    h_mask = cv2.morphologyEx(binary, cv2.MORPH_OPEN, h_kernel, iterations=2)
+    h_mask = _open_twice(binary, (h_kernel_len, 1))
 
     # Vertical lines: kernel height proportional to image height
     v_kernel_len = max(h // 30, 20)
-    v_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, v_kernel_len))
-    v_mask = cv2.morphologyEx(binary, cv2.MORPH_OPEN, v_kernel, iterations=2)
+    v_mask = _open_twice(binary, (1, v_kernel_len))
 
     return h_mask, v_mask
 
 
-def _extract_line_segments(mask: np.ndarray, direction: str) -> list[dict]:
-    """Convert binary mask to line segment coordinates."""
+def _open_twice(binary: np.ndarray, ksize: tuple[int, int]) -> np.ndarray:
+    """
+    Same result as morphologyEx(MORPH_OPEN, rect ksize, iterations=2), done as one
+    explicit erode + dilate. Two passes of a 1-D rect kernel of length n equal one
+    pass of length 2n-1 (anchored where the two anchors add up), and a single pass
+    with a replicated border stays on OpenCV's separable SIMD path.
+    """
+    kw, kh = ksize
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (2 * kw - 1, 2 * kh - 1))
+    anchor = (2 * (kw // 2), 2 * (kh // 2))
+    eroded = cv2.erode(binary, kernel, anchor=anchor, borderType=cv2.BORDER_REPLICATE)
+    return cv2.dilate(eroded, kernel, anchor=anchor, borderType=cv2.BORDER_REPLICATE)
+
+
+def _extract_line_segments(mask: np.ndarray, direction: str, scale: int = 1) -> np.ndarray:
+    """
+    Convert binary mask to line segments: an H_LINE_DTYPE / V_LINE_DTYPE array.
+    A mask detected on a downscaled page is up-projected by `scale`.
+    """
     contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    lines = []
-    for cnt in contours:
-        x, y, bw, bh = cv2.boundingRect(cnt)
-        if direction == "horizontal":
-            # Filter: width must be significantly larger than height
-            if bw > bh * 3 and bw > 30:
-                lines.append({"y": y + bh // 2, "x1": x, "x2": x + bw, "width": bw})
-        else:
-            # Filter: height must be significantly larger than width
-            if bh > bw * 3 and bh > 15:
-                lines.append({"x": x + bw // 2, "y1": y, "y2": y + bh, "height": bh})
+    rects = np.array([cv2.boundingRect(cnt) for cnt in contours], dtype=np.int32).reshape(-1, 4)
+    x, y, bw, bh = (rects * scale).T
+
+    if direction == "horizontal":
+        # Filter: width must be significantly larger than height
+        keep = (bw > bh * 3) & (bw > 30)
+        lines = np.empty(np.count_nonzero(keep), dtype=H_LINE_DTYPE)
+        lines["y"] = y[keep] + bh[keep] // 2
+        lines["x1"] = x[keep]
+        lines["x2"] = x[keep] + bw[keep]
+        lines["width"] = bw[keep]
+        return lines
+
+    # Filter: height must be significantly larger than width
+    keep = (bh > bw * 3) & (bh > 15)
+    lines = np.empty(np.count_nonzero(keep), dtype=V_LINE_DTYPE)
+    lines["x"] = x[keep] + bw[keep] // 2
+    lines["y1"] = y[keep]
+    lines["y2"] = y[keep] + bh[keep]
+    lines["height"] = bh[keep]
     return lines
 
 
-def _cluster_values(values: list[int], tolerance: int) -> list[int]:
+def _cluster_values(values: np.ndarray | list[int], tolerance: int) -> list[int]:
     """Cluster nearby values and return the mean of each cluster."""
-    if not values:
+    if len(values) == 0:
         return []
-    values = sorted(values)
-    clusters = [[values[0]]]
-    for v in values[1:]:
-        if v - clusters[-1][-1] <= tolerance:
-            clusters[-1].append(v)
-        else:
-            clusters.append([v])
-    return [int(sum(c) / len(c)) for c in clusters]
+    v = np.sort(np.asarray(values, dtype=np.int64))
+    # A new cluster starts wherever the gap to the previous value exceeds tolerance
+    starts = np.r_[0, np.flatnonzero(np.diff(v) > tolerance) + 1]
+    sums = np.add.reduceat(v, starts)
+    counts = np.diff(np.r_[starts, len(v)])
+    return (sums // counts).tolist()
 
 
-def _split_at_large_gaps(lines: list[dict]) -> list[list[dict]]:
-    """Split a sorted list of h-lines into sub-groups at unusually large y-gaps."""
+def _split_at_large_gaps(lines: np.ndarray) -> list[np.ndarray]:
+    """Split y-sorted h-lines into sub-groups at unusually large y-gaps."""
     if len(lines) <= 1:
         return [lines]
 
-    gaps = [lines[i + 1]["y"] - lines[i]["y"] for i in range(len(lines) - 1)]
-    median_gap = sorted(gaps)[len(gaps) // 2]
+    gaps = np.diff(lines["y"].astype(np.int64))
+    median_gap = np.partition(gaps, len(gaps) // 2)[len(gaps) // 2]
 
     # A gap > 2.5x the median (but at least 15px) is a break point
     threshold = max(median_gap * 2.5, 15)
 
-    sub_groups: list[list[dict]] = [[lines[0]]]
-    for i, gap in enumerate(gaps):
-        if gap > threshold:
-            sub_groups.append([lines[i + 1]])
-        else:
-            sub_groups[-1].append(lines[i + 1])
-
-    return sub_groups
+    return np.split(lines, np.flatnonzero(gaps > threshold) + 1)
 
 
 def _find_table_regions(
-    h_lines: list[dict], v_lines: list[dict], img_width: int, img_height: int
+    h_lines: np.ndarray, v_lines: np.ndarray, img_width: int, img_height: int
 ) -> list[dict]:
     """
     Group horizontal lines into table regions.
@@ -163,56 +317,59 @@ def _find_table_regions(
         return []
 
     # Sort by y position
-    h_lines = sorted(h_lines, key=lambda l: l["y"])
+    h_lines = h_lines[np.argsort(h_lines["y"], kind="stable")]
 
     min_table_width = img_width * 0.25
 
-    # Step 1: Group lines by x-range overlap
-    x_groups: list[list[dict]] = []
-    current_group = [h_lines[0]]
-
-    for line in h_lines[1:]:
-        group_x1 = min(l["x1"] for l in current_group)
-        group_x2 = max(l["x2"] for l in current_group)
-        overlap = min(line["x2"], group_x2) - max(line["x1"], group_x1)
-        line_width = line["x2"] - line["x1"]
-
-        if overlap > line_width * 0.5:
-            current_group.append(line)
+    # Step 1: Group consecutive lines by x-range overlap; each group is a
+    # [start, end) slice of h_lines, its x-extent tracked as it grows
+    xs1 = h_lines["x1"].tolist()
+    xs2 = h_lines["x2"].tolist()
+    x_groups: list[tuple[int, int]] = []
+    start = 0
+    group_x1, group_x2 = xs1[0], xs2[0]
+
+    for i in range(1, len(h_lines)):
+        line_x1, line_x2 = xs1[i], xs2[i]
+        overlap = min(line_x2, group_x2) - max(line_x1, group_x1)
+
+        if overlap > (line_x2 - line_x1) * 0.5:
+            group_x1 = min(group_x1, line_x1)
+            group_x2 = max(group_x2, line_x2)
         else:
-            if len(current_group) >= 3:
-                x_groups.append(current_group)
-            current_group = [line]
+            if i - start >= 3:
+                x_groups.append((start, i))
+            start = i
+            group_x1, group_x2 = line_x1, line_x2
 
-    if len(current_group) >= 3:
-        x_groups.append(current_group)
+    if len(h_lines) - start >= 3:
+        x_groups.append((start, len(h_lines)))
 
     # Step 2: Within each x-group, split at large y-gaps to separate
     # decorative lines (titles, dividers) from actual table row separators
     regions = []
-    for group in x_groups:
-        sub_groups = _split_at_large_gaps(group)
+    for start, end in x_groups:
+        sub_groups = _split_at_large_gaps(h_lines[start:end])
         for sg in sub_groups:
             if len(sg) < 3:
                 continue
 
-            x1 = min(l["x1"] for l in sg)
-            x2 = max(l["x2"] for l in sg)
-            y1 = sg[0]["y"]
-            y2 = sg[-1]["y"]
+            x1 = int(sg["x1"].min())
+            x2 = int(sg["x2"].max())
+            y1 = int(sg["y"][0])
+            y2 = int(sg["y"][-1])
 
             if x2 - x1 < min_table_width:
                 continue
 
-            row_ys = _cluster_values([l["y"] for l in sg], tolerance=8)
+            row_ys = _cluster_values(sg["y"], tolerance=8)
             if len(row_ys) < 3:
                 continue
 
             # Find vertical lines within this region
-            region_v_lines = [
-                vl for vl in v_lines
-                if vl["x"] >= x1 - 10 and vl["x"] <= x2 + 10
-                and vl["y1"] <= y2 + 10 and vl["y2"] >= y1 - 10
+            region_v_lines = v_lines[
+                (v_lines["x"] >= x1 - 10) & (v_lines["x"] <= x2 + 10)
+                & (v_lines["y1"] <= y2 + 10) & (v_lines["y2"] >= y1 - 10)
             ]
 
             regions.append({
@@ -225,13 +382,14 @@ def _find_table_regions(
 
 
 def _determine_columns(
-    region: dict, blocks: list[dict], img_width: int
+    region: dict, blocks: list[dict], img_width: int, centers: np.ndarray
 ) -> list[int]:
     """
     Determine column boundaries for a table region.
     Strategy A: Use vertical lines if enough are detected.
     Strategy B: Infer from block positions in the header row.
     Returns sorted list of column x-boundaries (including left and right edges).
+    centers holds the (x, y) center of each block (see _block_centers).
     """
     x1, y1, x2, y2 = region["bbox"]
     row_ys = region["row_ys"]
@@ -239,12 +397,9 @@ def _determine_columns(
 
     # Strategy A: vertical lines that span most of the table height
     table_height = y2 - y1
-    tall_v_lines = [
-        vl for vl in v_lines
-        if (vl["y2"] - vl["y1"]) >= table_height * 0.4
-    ]
+    tall_v_lines = v_lines[(v_lines["y2"] - v_lines["y1"]) >= table_height * 0.4]
     if len(tall_v_lines) >= 3:
-        col_xs = _cluster_values([vl["x"] for vl in tall_v_lines], tolerance=10)
+        col_xs = _cluster_values(tall_v_lines["x"], tolerance=10)
         # Add table edges if not already covered
         if col_xs and col_xs[0] > x1 + 15:
             col_xs.insert(0, x1)
@@ -257,24 +412,23 @@ def _determine_columns(
     if len(row_ys) < 2:
         return [x1, x2]
 
-    best_blocks: list[dict] = []
+    cx, cy = centers[:, 0], centers[:, 1]
+    in_x = (x1 - 5 <= cx) & (cx <= x2 + 5)
+    best_idx = np.empty(0, dtype=np.intp)
     # Try each row band and pick the one with the most blocks
     for r in range(min(len(row_ys) - 1, 5)):
         r_top = row_ys[r]
         r_bot = row_ys[r + 1]
         margin = (r_bot - r_top) * 0.3
-        row_blocks = [
-            b for b in blocks
-            if _block_in_region(b["bbox"], [x1 - 5, r_top - margin, x2 + 5, r_bot + margin])
-        ]
-        if len(row_blocks) > len(best_blocks):
-            best_blocks = row_blocks
-
-    if len(best_blocks) < 2:
+        row_idx = np.flatnonzero(in_x & (r_top - margin <= cy) & (cy <= r_bot + margin))
+        if len(row_idx) > len(best_idx):
+            best_idx = row_idx
+
+    if len(best_idx) < 2:
         return [x1, x2]
 
     # Sort blocks left to right
-    best_blocks.sort(key=lambda b: b["bbox"][0])
+    best_blocks = sorted((blocks[i] for i in best_idx.tolist()), key=lambda b: b["bbox"][0])
 
     # Column boundaries = midpoints between consecutive blocks
     col_xs = [x1]
@@ -287,18 +441,14 @@ def _determine_columns(
     return col_xs
 
 
-def _block_in_region(block_bbox: list, region_bbox: list) -> bool:
-    """Check if a block's center falls within the region."""
-    bx_center = (block_bbox[0] + block_bbox[2]) / 2
-    by_center = (block_bbox[1] + block_bbox[3]) / 2
-    return (
-        region_bbox[0] <= bx_center <= region_bbox[2]
-        and region_bbox[1] <= by_center <= region_bbox[3]
-    )
+def _block_centers(blocks: list[dict]) -> np.ndarray:
+    """(N, 2) array of block bbox centers, computed once per page for all regions."""
+    bboxes = np.array([b["bbox"] for b in blocks], dtype=np.float64).reshape(-1, 4)
+    return np.column_stack(((bboxes[:, 0] + bboxes[:, 2]) / 2, (bboxes[:, 1] + bboxes[:, 3]) / 2))
 
 
 def _build_table_grid(
-    region: dict, columns: list[int], blocks: list[dict]
+    region: dict, columns: list[int], blocks: list[dict], centers: np.ndarray
 ) -> list[list[str]]:
     """Map OCR blocks into a row x column grid using center-point matching."""
     row_ys = region["row_ys"]
@@ -314,81 +464,131 @@ def _build_table_grid(
     # Expand region slightly for block matching
     margin_y = max((row_ys[1] - row_ys[0]) * 0.2, 5) if num_rows > 0 else 10
 
-    # Collect blocks that fall within the table region
-    table_blocks = [
-        b for b in blocks
-        if _block_in_region(
-            b["bbox"],
-            [x1 - 10, row_ys[0] - margin_y, x2 + 10, row_ys[-1] + margin_y]
-        )
-    ]
-
-    for block in table_blocks:
-        bx_center = (block["bbox"][0] + block["bbox"][2]) / 2
-        by_center = (block["bbox"][1] + block["bbox"][3]) / 2
-
-        # Find row
-        row_idx = -1
-        for r in range(num_rows):
-            r_top = row_ys[r] - margin_y
-            r_bot = row_ys[r + 1] + margin_y if r + 1 < len(row_ys) else y2 + margin_y
-            if r_top <= by_center <= r_bot:
-                row_idx = r
-                break
-        if row_idx < 0:
-            continue
-
-        # Find column
-        col_idx = -1
-        for c in range(num_cols):
-            if columns[c] - 10 <= bx_center <= columns[c + 1] + 10:
-                col_idx = c
-                break
-        if col_idx < 0:
-            continue
-
+    if not blocks:
+        return grid
+
+    bx_center, by_center = centers[:, 0], centers[:, 1]
+
+    # Find row: the first band [row_ys[r] - margin, row_ys[r + 1] + margin]
+    # containing the center. row_ys is sorted, so that's the first band whose
+    # bottom reaches the center, if its top doesn't lie below it (later tops
+    # only lie lower)
+    ys = np.asarray(row_ys, dtype=np.float64)
+    row_idx = np.searchsorted(ys[1:] + margin_y, by_center, side="left")
+    in_row = row_idx < num_rows
+    in_row[in_row] &= ys[row_idx[in_row]] - margin_y <= by_center[in_row]
+
+    # Find column: first [columns[c] - 10, columns[c + 1] + 10] containing the
+    # center. Boundaries inferred from block gaps need not be monotonic, so
+    # match against every column at once instead of binary-searching
+    cols = np.asarray(columns, dtype=np.float64)
+    col_hits = (cols[:-1] - 10 <= bx_center[:, None]) & (bx_center[:, None] <= cols[1:] + 10)
+    col_idx = col_hits.argmax(axis=1)
+    in_col = col_hits.any(axis=1)
+
+    # Only blocks inside the (slightly expanded) table region are placed
+    in_table = (x1 - 10 <= bx_center) & (bx_center <= x2 + 10) & in_row & in_col
+
+    for i in np.flatnonzero(in_table).tolist():
+        r, c = row_idx[i], col_idx[i]
         # Append text (multiple blocks may land in same cell)
-        existing = grid[row_idx][col_idx]
+        existing = grid[r][c]
         if existing:
-            grid[row_idx][col_idx] = existing + " " + block["text"]
+            grid[r][c] = existing + " " + blocks[i]["text"]
         else:
-            grid[row_idx][col_idx] = block["text"]
+            grid[r][c] = blocks[i]["text"]
 
     return grid
 
 
 def _grid_to_html(grid: list[list[str]], has_header: bool = True) -> str:
-    """Generate minimal HTML table from a grid. Frontend applies Tailwind styling."""
+    """
+    Generate minimal HTML table from a grid. Frontend applies Tailwind styling.
+    Cell text is OCR output, so it is HTML-escaped.
+    """
     if not grid:
         return ""
 
-    rows_html = []
+    buf = io.StringIO()
+    buf.write("<table>")
+    header = has_header and len(grid) > 1
     for i, row in enumerate(grid):
         tag = "th" if (has_header and i == 0) else "td"
-        cells = "".join(f"<{tag}>{cell}</{tag}>" for cell in row)
-        rows_html.append(f"<tr>{cells}</tr>")
-
-    header_part = ""
-    body_rows = rows_html
-    if has_header and len(rows_html) > 1:
-        header_part = f"<thead>{rows_html[0]}</thead>"
-        body_rows = rows_html[1:]
-    body_part = "<tbody>" + "".join(body_rows) + "</tbody>"
-
-    return f"<table>{header_part}{body_part}</table>"
+        if i == 0 and header:
+            buf.write("<thead>")
+        elif i == (1 if header else 0):
+            buf.write("<tbody>")
+        buf.write("<tr>")
+        if row:
+            # Escape the whole row in one call, joined on NUL (never in OCR text),
+            # then turn the separators into cell boundaries
+            cells = html.escape("\0".join(row), quote=False)
+            buf.write(f"<{tag}>")
+            buf.write(cells.replace("\0", f"</{tag}><{tag}>"))
+            buf.write(f"</{tag}>")
+        buf.write("</tr>")
+        if i == 0 and header:
+            buf.write("</thead>")
+    buf.write("</tbody></table>")
+    return buf.getvalue()
+
+
+def _process_region(
+    region: dict, blocks: list[dict], centers: np.ndarray, img_width: int
+) -> dict | None:
+    """Build one table region's grid and HTML; None if it doesn't look like a table."""
+    columns = _determine_columns(region, blocks, img_width, centers)
+    grid = _build_table_grid(region, columns, blocks, centers)
+
+    # Trim leading rows that are mostly empty (non-table header/section rows)
+    # Find the first row where most columns have content (the actual header)
+    num_cols = len(columns) - 1
+    start_idx = 0
+    for i, row in enumerate(grid):
+        filled = sum(1 for cell in row if cell.strip())
+        if filled >= max(num_cols * 0.8, 3):
+            start_idx = i
+            break
+    grid = grid[start_idx:]
+
+    # Also trim trailing empty rows
+    while grid and all(not cell.strip() for cell in grid[-1]):
+        grid.pop()
+
+    # Skip grids that are too small or too sparse (likely false positives)
+    total_cells = len(grid) * num_cols if grid else 0
+    non_empty = sum(1 for row in grid for cell in row if cell.strip())
+    if len(grid) < 2 or non_empty < 3:
+        return None
+    # Reject if fill rate is below 30% (section dividers, not real tables)
+    if total_cells > 0 and non_empty / total_cells < 0.3:
+        return None
+    # Reject if too many columns (>10 is almost certainly wrong)
+    if num_cols > 10:
+        return None
+
+    table_html = _grid_to_html(grid, has_header=True)
+    if not table_html:
+        return None
+    return {
+        "bbox": [round(v, 1) for v in region["bbox"]],
+        "html": table_html,
+    }
 
 
-def extract_tables(img: Image.Image, blocks: list[dict]) -> list[dict]:
+def extract_tables(img: np.ndarray, blocks: list[dict]) -> list[dict]:
     """
     Extract tables from a page image using OpenCV line detection + OCR block mapping.
     Returns list of {"bbox": [x1,y1,x2,y2], "html": "<table>..."}.
     """
-    img_array = np.array(img)
+    # The page array is only read here; never copy it (~25 MB at 300 DPI)
+    img_array = np.asarray(img)
     h, w = img_array.shape[:2]
 
-    h_mask, v_mask = _detect_lines(img_array)
-    h_lines = _extract_line_segments(h_mask, "horizontal")
-    v_lines = _extract_line_segments(v_mask, "vertical")
+    gray, scale = _line_detection_gray(img_array)
+    h_mask, v_mask = _detect_lines(gray)
+    h_lines = _extract_line_segments(h_mask, "horizontal", scale)
+    v_lines = _extract_line_segments(v_mask, "vertical", scale)
 
     logger.info(f"Detected {len(h_lines)} h-lines, {len(v_lines)} v-lines")
 
@@ -398,50 +598,23 @@ def extract_tables(img: Image.Image, blocks: list[dict]) -> list[dict]:
     regions = _find_table_regions(h_lines, v_lines, w, h)
     logger.info(f"Found {len(regions)} table region(s)")
 
+    # Block centers are shared by every region's column and cell matching
+    centers = _block_centers(blocks)
+
+    # Regions are processed in turn: each takes well under a millisecond of
+    # mostly GIL-bound Python/NumPy work, and pages already run in parallel
+    # on the page pool (settings.ocr_threads)
     tables = []
     for region in regions:
-        columns = _determine_columns(region, blocks, w)
-        grid = _build_table_grid(region, columns, blocks)
-
-        # Trim leading rows that are mostly empty (non-table header/section rows)
-        # Find the first row where most columns have content (the actual header)
-        num_cols = len(columns) - 1
-        start_idx = 0
-        for i, row in enumerate(grid):
-            filled = sum(1 for cell in row if cell.strip())
-            if filled >= max(num_cols * 0.8, 3):
-                start_idx = i
-                break
-        grid = grid[start_idx:]
-
-        # Also trim trailing empty rows
-        while grid and all(not cell.strip() for cell in grid[-1]):
-            grid.pop()
-
-        # Skip grids that are too small or too sparse (likely false positives)
-        total_cells = len(grid) * num_cols if grid else 0
-        non_empty = sum(1 for row in grid for cell in row if cell.strip())
-        if len(grid) < 2 or non_empty < 3:
-            continue
-        # Reject if fill rate is below 30% (section dividers, not real tables)
-        if total_cells > 0 and non_empty / total_cells < 0.3:
-            continue
-        # Reject if too many columns (>10 is almost certainly wrong)
-        if num_cols > 10:
-            continue
-
-        html = _grid_to_html(grid, has_header=True)
-        if html:
-            tables.append({
-                "bbox": [round(v, 1) for v in region["bbox"]],
-                "html": html,
-            })
+        table = _process_region(region, blocks, centers, w)
+        if table:
+            tables.append(table)
 
     logger.info(f"Extracted {len(tables)} table(s)")
     return tables
 
 
-def process_page(img: Image.Image, extract_table: bool = True) -> dict:
+def process_page(img: np.ndarray, extract_table: bool = True) -> dict:
     """
     Full processing for a single page: OCR + optional table extraction.
     Returns:
@@ -454,10 +627,20 @@ def process_page(img: Image.Image, extract_table: bool = True) -> dict:
             "confidence": float,
         }
     """
-    width, height = img.size
+    return process_pages([img], extract_table)[0]
+
+
+def process_pages(imgs: list[np.ndarray], extract_table: bool = True) -> list[dict]:
+    """Process several pages with one batched OCR pass; one process_page() result each."""
+    ocr_results = batch_ocr_images(imgs)
+    return _map_pages(
+        lambda page: _page_result(page[0], page[1], extract_table),
+        list(zip(imgs, ocr_results)),
+    )
+
 
-    # Run OCR
-    ocr_result = ocr_image(img)
+def _page_result(img: np.ndarray, ocr_result: dict, extract_table: bool) -> dict:
+    height, width = img.shape[:2]
 
     # Table extraction using OpenCV line detection + OCR block mapping
     tables = []
@@ -8,19 +8,40 @@ Usage:
 """
 
 import logging
+import queue
 import signal
 import sys
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, insert
 from sqlalchemy.orm import Session, sessionmaker
 
 from app.config import settings
 from app.models.document import Document, DocumentStatus
 from app.models.ocr_result import OCRPage
-from app.services.queue import dequeue_job
-from app.workers.pdf_processor import prepare_images, image_to_bytes
-from app.workers.ocr_processor import process_page
+from app.services.queue import (
+    add_pending_ai_batch,
+    dequeue_ai_batch_documents,
+    dequeue_jobs,
+    enqueue_ai_batch_document,
+    get_pending_ai_batches,
+    mark_job_done,
+    pool_stats,
+    renew_job_lease,
+    requeue_ai_batch_documents,
+    requeue_jobs,
+    remove_pending_ai_batch,
+)
+from app.workers.pdf_processor import (
+    PAGE_IMAGE_CONTENT_TYPE,
+    PAGE_IMAGE_EXT,
+    image_to_bytes,
+    prepare_images,
+)
+from app.workers.ocr_processor import process_pages
 
 logging.basicConfig(
     level=logging.INFO,
@@ -33,13 +54,25 @@ sync_db_url = settings.database_url.replace("+asyncpg", "+psycopg2")
 engine = create_engine(sync_db_url)
 SessionLocal = sessionmaker(bind=engine)
 
+# Concurrent page-image uploads per document
+UPLOAD_WORKERS = 4
+# Jobs taken from the queue per round trip. Small, so a backlog spreads across
+# worker replicas and a crashed worker loses only a few jobs.
+JOB_BATCH_SIZE = 4
+# Long documents renew their enqueue-once lease while pages are processed
+JOB_LEASE_RENEW_INTERVAL = 60.0  # seconds
+
 # S3 client (only if using S3 backend)
 s3_client = None
 if settings.storage_backend != "filesystem":
     import boto3
     from botocore.config import Config
 
-    s3_config = Config(s3={"addressing_style": "path"}, signature_version="s3v4")
+    s3_config = Config(
+        s3={"addressing_style": "path"},
+        signature_version="s3v4",
+        max_pool_connections=UPLOAD_WORKERS,
+    )
     s3_client = boto3.client(
         "s3",
         endpoint_url=settings.s3_endpoint_url,
@@ -84,7 +117,7 @@ def upload_file(key: str, data: bytes, content_type: str = "image/png"):
     )
 
 
-def run_ai_analysis(doc: Document, ocr_text: str, images: list, db):
+def run_ai_analysis(doc: Document, ocr_text: str, first_page, db):
     """Run AI analysis on the document after OCR."""
     from app.services.ai_service import analyze_document_text, analyze_document_with_image
 
@@ -97,9 +130,11 @@ def run_ai_analysis(doc: Document, ocr_text: str, images: list, db):
     try:
         # Try vision analysis with first page image if available
         result = None
-        if images:
-            first_page_bytes = image_to_bytes(images[0])
-            result = analyze_document_with_image(ocr_text, first_page_bytes)
+        if first_page is not None:
+            first_page_bytes = image_to_bytes(first_page)
+            result = analyze_document_with_image(
+                ocr_text, first_page_bytes, media_type=PAGE_IMAGE_CONTENT_TYPE
+            )
 
         # Fall back to text-only analysis
         if result is None:
@@ -109,73 +144,232 @@ def run_ai_analysis(doc: Document, ocr_text: str, images: list, db):
             logger.warning("AI analysis returned no result")
             return
 
-        # Store AI results in document
-        doc.category = result.get("category")
-        doc.category_confidence = result.get("category_confidence")
-        doc.summary = result.get("summary")
-        doc.tags = result.get("tags", [])
-        doc.entities = result.get("entities", {})
-        doc.document_date = result.get("document_date")
-        doc.key_points = result.get("key_points", [])
-        doc.ai_raw_response = result
-        db.commit()
-
-        logger.info(
-            f"AI analysis done: category={doc.category} "
-            f"(confidence={doc.category_confidence}), "
-            f"tags={doc.tags}, entities_count="
-            f"{sum(len(v) for v in (doc.entities or {}).values() if isinstance(v, list))}"
-        )
+        store_ai_result(doc, result, db)
 
     except Exception as e:
         logger.exception(f"AI analysis failed: {e}")
         # Don't fail the whole document processing
 
 
+def store_ai_result(doc: Document, result: dict, db):
+    """Store AI results in document."""
+    doc.category = result.get("category")
+    doc.category_confidence = result.get("category_confidence")
+    doc.summary = result.get("summary")
+    doc.tags = result.get("tags", [])
+    doc.entities = result.get("entities", {})
+    doc.document_date = result.get("document_date")
+    doc.key_points = result.get("key_points", [])
+    doc.ai_raw_response = result
+    db.commit()
+
+    logger.info(
+        f"AI analysis done: category={doc.category} "
+        f"(confidence={doc.category_confidence}), "
+        f"tags={doc.tags}, entities_count="
+        f"{sum(len(v) for v in (doc.entities or {}).values() if isinstance(v, list))}"
+    )
+
+
+def _search_fields(doc: Document) -> dict:
+    return {
+        "document_id": str(doc.id),
+        "original_filename": doc.original_filename,
+        "content_type": doc.content_type,
+        "ocr_text": doc.ocr_text,
+        "summary": doc.summary,
+        "category": doc.category,
+        "tags": doc.tags,
+        "entities": doc.entities,
+        "key_points": doc.key_points,
+        "document_date": doc.document_date,
+        "page_count": doc.page_count,
+        "file_size": doc.file_size,
+        "created_at": doc.created_at.isoformat() if doc.created_at else None,
+    }
+
+
+# Finished documents are indexed in bulk: a buffer is flushed when it is full,
+# when its oldest entry is SEARCH_FLUSH_INTERVAL old, or after each job batch.
+SEARCH_FLUSH_SIZE = 32
+SEARCH_FLUSH_INTERVAL = 5.0  # seconds
+_search_buffer: list[dict] = []
+_search_buffer_since = 0.0
+
+
 def index_to_search(doc: Document):
-    """Index the document for full-text search."""
+    """Queue the document for full-text search indexing."""
+    global _search_buffer_since
+    if not _search_buffer:
+        _search_buffer_since = time.monotonic()
+    _search_buffer.append(_search_fields(doc))
+    if len(_search_buffer) >= SEARCH_FLUSH_SIZE:
+        flush_search_index()
+
+
+def flush_search_index(only_if_due: bool = False):
+    """Send buffered documents to the search backend in one bulk request."""
+    if not _search_buffer:
+        return
+    if only_if_due and time.monotonic() - _search_buffer_since < SEARCH_FLUSH_INTERVAL:
+        return
+    docs = _search_buffer.copy()
+    _search_buffer.clear()
     try:
         if settings.search_backend == "postgresql":
-            from app.services.search import pg_index_document, pg_ensure_index
+            from app.services.search import pg_bulk_index_documents, pg_ensure_index
             pg_ensure_index()
-            pg_index_document(
-                document_id=str(doc.id),
-                original_filename=doc.original_filename,
-                content_type=doc.content_type,
-                ocr_text=doc.ocr_text,
-                summary=doc.summary,
-                category=doc.category,
-                tags=doc.tags,
-                entities=doc.entities,
-                key_points=doc.key_points,
-                document_date=doc.document_date,
-                page_count=doc.page_count,
-                file_size=doc.file_size,
-                created_at=doc.created_at.isoformat() if doc.created_at else None,
-            )
+            pg_bulk_index_documents(docs)
         else:
-            from app.services.search import index_document, ensure_index
+            from app.services.search import bulk_index_documents, ensure_index
             ensure_index()
-            index_document(
-                document_id=str(doc.id),
-                original_filename=doc.original_filename,
-                content_type=doc.content_type,
-                ocr_text=doc.ocr_text,
-                summary=doc.summary,
-                category=doc.category,
-                tags=doc.tags,
-                entities=doc.entities,
-                key_points=doc.key_points,
-                document_date=doc.document_date,
-                page_count=doc.page_count,
-                file_size=doc.file_size,
-                created_at=doc.created_at.isoformat() if doc.created_at else None,
-            )
+            bulk_index_documents(docs)
     except Exception as e:
         logger.exception(f"Search indexing failed: {e}")
         # Don't fail the whole document processing
 
 
+# Page pipeline: rendering, OCR and page-image upload use different resources
+# (PyMuPDF, ONNX Runtime, network), so they run as concurrent stages connected
+# by bounded queues. The OCR stage batches pages: it runs as soon as
+# OCR_BATCH_SIZE pages are waiting, or OCR_BATCH_WAIT after the first one.
+OCR_BATCH_SIZE = 8
+OCR_BATCH_WAIT = 0.1  # seconds
+PIPELINE_QUEUE_SIZE = 2
+_END = object()
+
+
+def _put(q: queue.Queue, item, stop: threading.Event) -> bool:
+    """Put into a bounded queue unless the pipeline is being torn down."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q: queue.Queue, stop: threading.Event):
+    """Blocking get that returns None once the pipeline is being torn down."""
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return None
+
+
+def _render_stage(images, render_q: queue.Queue, stop: threading.Event):
+    try:
+        for item in enumerate(images, start=1):
+            if not _put(render_q, item, stop):
+                return
+        _put(render_q, _END, stop)
+    except Exception as e:
+        _put(render_q, e, stop)
+
+
+def _ocr_stage(render_q: queue.Queue, ocr_q: queue.Queue, stop: threading.Event):
+    try:
+        tail = None
+        while tail is None:
+            item = _get(render_q, stop)
+            if item is None:
+                return
+            if item is _END or isinstance(item, Exception):
+                tail = item
+                break
+            batch = [item]
+            deadline = time.monotonic() + OCR_BATCH_WAIT
+            while len(batch) < OCR_BATCH_SIZE:
+                try:
+                    item = render_q.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is _END or isinstance(item, Exception):
+                    tail = item
+                    break
+                batch.append(item)
+
+            results = process_pages([img for _, img in batch], extract_table=True)
+            for (page_num, img), page_result in zip(batch, results):
+                if not _put(ocr_q, (page_num, img, page_result), stop):
+                    return
+        _put(ocr_q, tail, stop)
+    except Exception as e:
+        _put(ocr_q, e, stop)
+
+
+def _upload_page_image(key: str, img):
+    upload_file(key, image_to_bytes(img), PAGE_IMAGE_CONTENT_TYPE)
+
+
+def run_page_pipeline(doc: Document, images) -> tuple[list[dict], object]:
+    """
+    OCR every page and upload its image.
+    Returns the OCRPage rows in page order and the first page image (for AI analysis).
+    """
+    # Rendered pages are large bitmaps: keep only a couple queued between stages
+    render_q: queue.Queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    ocr_q: queue.Queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    stop = threading.Event()
+    stages = [
+        threading.Thread(target=_render_stage, args=(images, render_q, stop), daemon=True),
+        threading.Thread(target=_ocr_stage, args=(render_q, ocr_q, stop), daemon=True),
+    ]
+    for t in stages:
+        t.start()
+
+    pages_prefix = f"{doc.s3_key.rsplit('.', 1)[0]}/pages"
+    page_rows = []
+    first_page = None
+    lease_renewed = time.monotonic()
+    try:
+        # Upload stage: this thread hands page images to the upload pool
+        with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as pool:
+            uploads: deque = deque()
+            while (item := ocr_q.get()) is not _END:
+                if isinstance(item, Exception):
+                    raise item
+                page_num, img, page_result = item
+                if page_num == 1:
+                    first_page = img
+                if time.monotonic() - lease_renewed >= JOB_LEASE_RENEW_INTERVAL:
+                    renew_job_lease(str(doc.id))
+                    lease_renewed = time.monotonic()
+                page_s3_key = f"{pages_prefix}/{page_num:04d}.{PAGE_IMAGE_EXT}"
+                uploads.append(pool.submit(_upload_page_image, page_s3_key, img))
+                # A pending upload holds its page image; wait once all workers are busy
+                if len(uploads) > UPLOAD_WORKERS:
+                    uploads.popleft().result()
+
+                # Collect page OCR result; all pages are inserted in one batch
+                page_rows.append({
+                    "document_id": doc.id,
+                    "page_number": page_num,
+                    "width": page_result["width"],
+                    "height": page_result["height"],
+                    "full_text": page_result["full_text"],
+                    "blocks": page_result["blocks"],
+                    "tables": page_result["tables"],
+                    "page_image_s3_key": page_s3_key,
+                    "confidence": page_result["confidence"],
+                })
+                logger.info(
+                    f"Page {page_num}: {len(page_result['blocks'])} text blocks, "
+                    f"{len(page_result['tables'])} tables, "
+                    f"confidence={page_result['confidence']:.2%}"
+                )
+            for upload in uploads:
+                upload.result()
+    finally:
+        stop.set()
+        for t in stages:
+            t.join()
+    return page_rows, first_page
+
+
 def process_document(document_id: str):
     """Process a single document through the OCR pipeline."""
     db: Session = SessionLocal()
@@ -198,46 +392,14 @@ def process_document(document_id: str):
         file_bytes = download_file(doc.s3_key)
         logger.info(f"Downloaded {len(file_bytes)} bytes: {doc.s3_key}")
 
-        # Convert to images
-        images = prepare_images(file_bytes, doc.content_type)
-        page_count = len(images)
-        logger.info(f"Converted to {page_count} page(s)")
-
-        # Process each page
-        all_texts = []
-        for page_num, img in enumerate(images, start=1):
-            logger.info(f"Processing page {page_num}/{page_count}")
-
-            # Run OCR + table extraction
-            page_result = process_page(img, extract_table=True)
-
-            # Save page image
-            page_s3_key = f"{doc.s3_key.rsplit('.', 1)[0]}/pages/{page_num:04d}.png"
-            page_img_bytes = image_to_bytes(img)
-            upload_file(page_s3_key, page_img_bytes)
-
-            # Save page OCR result to DB
-            ocr_page = OCRPage(
-                document_id=doc.id,
-                page_number=page_num,
-                width=page_result["width"],
-                height=page_result["height"],
-                full_text=page_result["full_text"],
-                blocks=page_result["blocks"],
-                tables=page_result["tables"],
-                page_image_s3_key=page_s3_key,
-                confidence=page_result["confidence"],
-            )
-            db.add(ocr_page)
-
-            if page_result["full_text"]:
-                all_texts.append(page_result["full_text"])
+        # Render (lazily, page by page), OCR and upload pages as a pipeline
+        pages = prepare_images(file_bytes, doc.content_type)
+        page_rows, first_page = run_page_pipeline(doc, pages)
+        page_count = len(page_rows)
+        all_texts = [row["full_text"] for row in page_rows if row["full_text"]]
 
-            logger.info(
-                f"Page {page_num}: {len(page_result['blocks'])} text blocks, "
-                f"{len(page_result['tables'])} tables, "
-                f"confidence={page_result['confidence']:.2%}"
-            )
+        if page_rows:
+            db.execute(insert(OCRPage), page_rows)
 
         # Update document with aggregated OCR text
         full_ocr_text = "\n\n--- Page Break ---\n\n".join(all_texts)
@@ -248,7 +410,11 @@ def process_document(document_id: str):
         logger.info(f"OCR done: {doc.original_filename} — {page_count} pages")
 
         # --- Phase 3: AI Analysis ---
-        run_ai_analysis(doc, full_ocr_text, images, db)
+        if settings.ai_batch_enabled:
+            # Analysed later through the Message Batches API (see poll_ai_batches)
+            enqueue_ai_batch_document(str(doc.id))
+        else:
+            run_ai_analysis(doc, full_ocr_text, first_page, db)
 
         # --- Phase 4: Index for search ---
         index_to_search(doc)
@@ -271,6 +437,86 @@ def process_document(document_id: str):
         db.close()
 
 
+def submit_ai_batch(document_ids: list[str]):
+    """Submit queued documents' OCR text as one Message Batch."""
+    from app.services.ai_service import build_batch_request, submit_analysis_batch
+
+    db: Session = SessionLocal()
+    try:
+        docs = db.query(Document).filter(Document.id.in_(document_ids)).all()
+        requests = [
+            build_batch_request(str(doc.id), doc.ocr_text)
+            for doc in docs
+            if doc.ocr_text and len(doc.ocr_text.strip()) >= 10
+        ]
+    except Exception:
+        requeue_ai_batch_documents(document_ids)
+        raise
+    finally:
+        db.close()
+
+    if not requests:
+        return
+    batch_id = submit_analysis_batch(requests)
+    if batch_id:
+        add_pending_ai_batch(batch_id)
+    else:
+        # Nothing was created: keep the documents queued for the next poll
+        requeue_ai_batch_documents([request["custom_id"] for request in requests])
+
+
+def apply_ai_batch(batch_id: str):
+    """Store the results of a finished Message Batch and re-index its documents."""
+    from app.services.ai_service import collect_analysis_batch
+
+    try:
+        results = collect_analysis_batch(batch_id)
+    except Exception as e:
+        logger.exception(f"Failed to check AI batch {batch_id}: {e}")
+        return
+    if results is None:
+        return
+
+    db: Session = SessionLocal()
+    try:
+        for document_id, result in results.items():
+            doc = db.query(Document).filter(Document.id == document_id).first()
+            if doc is None or result is None:
+                continue
+            store_ai_result(doc, result, db)
+            index_to_search(doc)
+        flush_search_index()
+    finally:
+        db.close()
+
+    remove_pending_ai_batch(batch_id)
+    logger.info(f"Applied AI batch {batch_id}: {len(results)} result(s)")
+
+
+def poll_ai_batches():
+    document_ids = dequeue_ai_batch_documents(settings.ai_batch_max_items)
+    if document_ids:
+        submit_ai_batch(document_ids)
+    for batch_id in get_pending_ai_batches():
+        apply_ai_batch(batch_id)
+
+
+def handle_job(job: dict):
+    job_type = job.get("type")
+    if job_type == "ocr":
+        document_id = job.get("document_id")
+        if document_id:
+            try:
+                renew_job_lease(document_id)
+                process_document(document_id)
+            except Exception as e:
+                logger.exception(f"Unhandled error processing {document_id}: {e}")
+            finally:
+                mark_job_done(document_id)
+    else:
+        logger.warning(f"Unknown job type: {job_type}")
+
+
 def main():
     logger.info("OCR Worker started. Waiting for jobs...")
 
@@ -279,22 +525,28 @@ def main():
     from app.models.ocr_result import OCRPage  # ensure model is registered
     Base.metadata.create_all(bind=engine)
 
+    last_batch_poll = 0.0
     while not shutdown_flag:
-        job = dequeue_job(timeout=5)
-        if job is None:
-            continue
-
-        job_type = job.get("type")
-        if job_type == "ocr":
-            document_id = job.get("document_id")
-            if document_id:
-                try:
-                    process_document(document_id)
-                except Exception as e:
-                    logger.exception(f"Unhandled error processing {document_id}: {e}")
-        else:
-            logger.warning(f"Unknown job type: {job_type}")
-
+        if (
+            settings.ai_batch_enabled
+            and time.monotonic() - last_batch_poll >= settings.ai_batch_poll_interval
+        ):
+            last_batch_poll = time.monotonic()
+            try:
+                poll_ai_batches()
+            except Exception as e:
+                logger.exception(f"AI batch polling failed: {e}")
+
+        jobs = dequeue_jobs(max_count=JOB_BATCH_SIZE, timeout=5)
+        for i, job in enumerate(jobs):
+            if shutdown_flag:
+                requeue_jobs(jobs[i:])
+                break
+            handle_job(job)
+            flush_search_index(only_if_due=True)
+        flush_search_index()
+
+    logger.info(f"Redis pools at shutdown: {pool_stats()}")
     logger.info("OCR Worker stopped.")
 
 
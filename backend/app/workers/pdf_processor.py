@@ -1,47 +1,63 @@
 """Convert PDF pages to images and handle image files for OCR input."""
 
 import io
+from collections.abc import Iterator
 from pathlib import Path
 
+import cv2
 import fitz  # PyMuPDF
+import numpy as np
 from PIL import Image
 
 # Target DPI for OCR (higher = better accuracy but slower)
 OCR_DPI = 300
 
 
-def pdf_to_images(pdf_bytes: bytes) -> list[Image.Image]:
-    """Convert a PDF to a list of PIL Images, one per page."""
+def iter_pdf_pages(pdf_bytes: bytes) -> Iterator[np.ndarray]:
+    """
+    Render a PDF page by page as RGB arrays (H, W, 3), so only the current
+    page's pixmap is held in memory.
+    """
     doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    images = []
     zoom = OCR_DPI / 72  # 72 is default PDF DPI
     matrix = fitz.Matrix(zoom, zoom)
-    for page in doc:
-        pix = page.get_pixmap(matrix=matrix)
-        img = Image.open(io.BytesIO(pix.tobytes("png")))
-        images.append(img)
-    doc.close()
-    return images
-
-
-def load_image(image_bytes: bytes, content_type: str) -> list[Image.Image]:
-    """Load an image file, returning as a single-item list for uniform handling."""
+    try:
+        for page in doc:
+            pix = page.get_pixmap(matrix=matrix)
+            # View the raw samples directly; no PNG round trip or PIL conversion
+            arr = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+            yield arr[..., :3] if pix.n == 4 else arr
+    finally:
+        doc.close()
+
+
+def load_image(image_bytes: bytes, content_type: str) -> Iterator[np.ndarray]:
+    """Load an image file, returning a single-item iterator for uniform handling."""
     img = Image.open(io.BytesIO(image_bytes))
     if img.mode != "RGB":
         img = img.convert("RGB")
-    return [img]
+    return iter([np.asarray(img)])
 
 
-def prepare_images(file_bytes: bytes, content_type: str) -> list[Image.Image]:
-    """Convert any supported file to a list of PIL Images."""
+def prepare_images(file_bytes: bytes, content_type: str) -> Iterator[np.ndarray]:
+    """Convert any supported file to RGB page arrays, produced lazily."""
     if content_type == "application/pdf":
-        return pdf_to_images(file_bytes)
+        return iter_pdf_pages(file_bytes)
     else:
         return load_image(file_bytes, content_type)
 
 
-def image_to_bytes(img: Image.Image, fmt: str = "PNG") -> bytes:
-    """Convert PIL Image to bytes."""
-    buf = io.BytesIO()
-    img.save(buf, format=fmt)
-    return buf.getvalue()
+# Page images are previews for people, not OCR input, so lossy JPEG is enough:
+# several times smaller and faster to encode than PNG
+PAGE_IMAGE_CONTENT_TYPE = "image/jpeg"
+PAGE_IMAGE_EXT = "jpg"
+PAGE_IMAGE_JPEG_QUALITY = 85
+
+
+def image_to_bytes(img: np.ndarray) -> bytes:
+    """Encode an RGB page array as a JPEG page image (cv2 releases the GIL while encoding)."""
+    bgr = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
+    ok, buf = cv2.imencode(".jpg", bgr, [cv2.IMWRITE_JPEG_QUALITY, PAGE_IMAGE_JPEG_QUALITY])
+    if not ok:
+        raise ValueError("JPEG encoding failed")
+    return buf.tobytes()
@@ -32,7 +32,10 @@ export default function SearchPage() {
         skip: page * limit,
         limit,
       });
-      setResult(res);
+      // Later pages come back without facets; keep the ones from the first page
+      setResult((prev) =>
+        res.facets.categories || !prev ? res : { ...res, facets: prev.facets }
+      );
     } catch (e) {
       console.error(e);
     } finally {
@@ -183,7 +183,7 @@ export interface SearchHit {
   document_id: string;
   original_filename: string;
   content_type: string;
-  ocr_text: string;
+  ocr_text?: string;
   summary: string;
   category: string | null;
   tags: string[];